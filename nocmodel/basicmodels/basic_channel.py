@@ -53,6 +53,9 @@ class basic_channel_tbm(noc_tbm_base):
     Notes:
     *This model is completely behavioral
     """
+    __slots__ = ("channel_ref", "graph_ref", "channel_delay", "endpoints", 
+        "has_delay", "delay_fifo", "delay_fifo_max", "delay_event")
+
     def __init__(self, channel_ref, channel_delay=2):
         noc_tbm_base.__init__(self)
         if isinstance(channel_ref, channel):
@@ -91,17 +94,20 @@ class basic_channel_tbm(noc_tbm_base):
                         # time could be 0, when the packets arrive from both endpoints
                         # at the same time. In that case don't yield
                         if next_delay < 0:
-                            self.debug("delay_generator CATCH next_delay is '%d'" % next_delay)
+                            self.debug("delay_generator CATCH next_delay is '%d'", next_delay)
                         elif next_delay > 0:
                             yield myhdl.delay(next_delay)
-                        self.debug("delay_generator sending delayed packet (by %d), timed_packet format %s" % (next_delay, repr(timed_packet)) )
+                        self.debug("delay_generator sending delayed packet (by %d), timed_packet format %r", next_delay, timed_packet)
                         # use send()
                         retval = self.send(*timed_packet[1:])
                         # what to do in error case? report and continue
                         if retval != noc_tbm_errcodes.no_error:
-                            self.error("delay_generator send returns code '%d'?" % retval )
-                    self.delay_event.next = False
-                    yield self.delay_event.posedge
+                            self.error("delay_generator send returns code '%d'?", retval)
+                    # wait for a new packet. recv() toggles delay_event, so 
+                    # a packet put in the fifo after the check above always
+                    # wakes this generator (a clear-and-wait on posedge may 
+                    # lose it if recv() runs in the same step).
+                    yield self.delay_event
             self.generators.append(delay_generator)
 
         self.debugstate()
@@ -114,22 +120,22 @@ class basic_channel_tbm(noc_tbm_base):
         src always is self
         """
         # dest MUST be one of the channel endpoints
-        self.debug("-> send( %s , %s , %s , %s )" % (repr(src), repr(dest), repr(packet), repr(addattrs)))
+        self.debug("-> send( %r , %r , %r , %r )", src, dest, packet, addattrs)
         if isinstance(dest, int):
             # assume router direction
             thedest = self.graph_ref.get_router_by_address(dest)
-            if thedest == False:
-                self.error("-> send: dest %s not found" % repr(dest) )
+            if thedest is None:
+                self.error("-> send: dest %r not found", dest)
                 return noc_tbm_errcodes.tbm_badcall_send
         elif isinstance(dest, (router, ipcore)):
             thedest = dest
         else:
-            self.error("-> send: what is dest '%s'?" % repr(dest) )
+            self.error("-> send: what is dest '%r'?", dest)
             return noc_tbm_errcodes.tbm_badcall_send
 
         # check dest as one of the channel endpoints
         if thedest not in self.endpoints:
-            self.error("-> send: object %s is NOT one of the channel endpoints [%s,%s]" % (repr(thedest), repr(self.endpoints[0]), repr(self.endpoints[1])) )
+            self.error("-> send: object %r is NOT one of the channel endpoints [%r,%r]", thedest, self.endpoints[0], self.endpoints[1])
             return noc_tbm_errcodes.tbm_badcall_send
             
         # call trace functions
@@ -142,7 +148,7 @@ class basic_channel_tbm(noc_tbm_base):
         retval = thedest.tbm.recv(self.channel_ref, dest, packet, addattrs)
 
         # Something to do with the retval? Only report it.
-        self.debug("-> send returns code '%s'" % repr(retval))
+        self.debug("-> send returns code '%r'", retval)
         return retval
 
     def recv(self, src, dest, packet, addattrs=None):
@@ -151,23 +157,23 @@ class basic_channel_tbm(noc_tbm_base):
         it MUST be one of the objects in channel endpoints
         """
 
-        self.debug("-> recv( %s , %s , %s , %s )" % (repr(src), repr(dest), repr(packet), repr(addattrs)))
+        self.debug("-> recv( %r , %r , %r , %r )", src, dest, packet, addattrs)
         # src can be an address or a noc object.
         if isinstance(src, int):
             # assume router direction
             thesrc = self.graph_ref.get_router_by_address(src)
-            if thesrc == False:
-                self.error("-> recv: src %s not found" % repr(src) )
+            if thesrc is None:
+                self.error("-> recv: src %r not found", src)
                 return noc_tbm_errcodes.tbm_badcall_recv
         elif isinstance(src, (router, ipcore)):
             thesrc = src
         else:
-            self.error("-> recv: what is src '%s'?" % repr(src) )
+            self.error("-> recv: what is src '%r'?", src)
             return noc_tbm_errcodes.tbm_badcall_recv
 
         # check src as one of the channel endpoints
         if thesrc not in self.endpoints:
-            self.error("-> recv: object %s is NOT one of the channel endpoints [%s,%s]" % (repr(thesrc), repr(self.endpoints[0]), repr(self.endpoints[1])) )
+            self.error("-> recv: object %r is NOT one of the channel endpoints [%r,%r]", thesrc, self.endpoints[0], self.endpoints[1])
             return noc_tbm_errcodes.tbm_badcall_recv
             
         # call trace functions        
@@ -182,12 +188,12 @@ class basic_channel_tbm(noc_tbm_base):
         if self.has_delay:
             # put in delay fifo: store time and call attributes
             self.delay_fifo.append([myhdl.now(), self.channel_ref, self.endpoints[end_index], packet, addattrs])
-            self.debug("-> recv put in delay_fifo (delay %d)" % self.channel_delay)
+            self.debug("-> recv put in delay_fifo (delay %d)", self.channel_delay)
             # catch growing fifo
             if len(self.delay_fifo) > self.delay_fifo_max:
-                self.warning("-> recv: delay_fifo is getting bigger! current size is %d" % len(self.delay_fifo) )
-            # trigger event
-            self.delay_event.next = True
+                self.warning("-> recv: delay_fifo is getting bigger! current size is %d", len(self.delay_fifo))
+            # trigger event: any change wakes delay_generator
+            self.delay_event.next = not self.delay_event.val
             retval = noc_tbm_errcodes.no_error
         else:
             # use send() call directly
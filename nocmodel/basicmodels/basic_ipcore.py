@@ -59,14 +59,15 @@ class basic_ipcore_tbm(noc_tbm_base):
     * This model is completely behavioral.
     * See code comments to better understanding.
     """
+    __slots__ = ("ipcore_ref", "graph_ref", "retrytimes", "retrydelay", 
+        "localch", "protocol_ref", "incoming_packet", "outgoing_packet")
+
     def __init__(self, ipcore_ref):
         noc_tbm_base.__init__(self)
         if isinstance(ipcore_ref, ipcore):
             self.ipcore_ref = ipcore_ref
             self.graph_ref = ipcore_ref.graph_ref
-            self.logname = "IPCore '%s'" % ipcore_ref.name
-            if ipcore_ref.name == "":
-                self.logname = "IPCore '%s'" % ipcore_ref.router_ref.name
+            self.logname = "IPCore '%s'" % (ipcore_ref.name or ipcore_ref.router_ref.name)
         else:
             raise TypeError("This class needs a ipcore object as constructor argument.")
         
@@ -92,14 +93,21 @@ class basic_ipcore_tbm(noc_tbm_base):
         
         @myhdl.instance
         def outgoing_process():
+            # local bindings for the send loop
+            outgoing_packet = self.outgoing_packet
+            ipcore_ref = self.ipcore_ref
+            localch = self.localch
+            send = self.send
+            delay = myhdl.delay
+            err_ok = noc_tbm_errcodes.no_error
             while True:
-                yield self.outgoing_packet
+                yield outgoing_packet
                 # multiple tries
                 for i in range(self.retrytimes):
-                    retval = self.send(self.ipcore_ref, self.localch, self.outgoing_packet.val)
-                    if retval == noc_tbm_errcodes.no_error:
+                    retval = send(ipcore_ref, localch, outgoing_packet.val)
+                    if retval == err_ok:
                         break;
-                    yield myhdl.delay(self.retrydelay)
+                    yield delay(self.retrydelay)
         
         self.generators = [outgoing_process]
         self.debugstate()
@@ -127,7 +135,7 @@ class basic_ipcore_tbm(noc_tbm_base):
                   argument to pass them.
         """
         makegen = genfunction(din=self.incoming_packet, dout=self.outgoing_packet, tbm_ref=self, **kwargs)
-        self.debug("register_generator( %s ) generator is %s args %s" % (repr(genfunction), repr(makegen), repr(kwargs)))
+        self.debug("register_generator( %r ) generator is %r args %r", genfunction, makegen, kwargs)
         self.generators.append(makegen)
 
     # Transaction - related methods
@@ -140,13 +148,13 @@ class basic_ipcore_tbm(noc_tbm_base):
         * In theory src should be self.ipcore_ref, and dest should be 
           self.localch . This may be checked for errors.
         """
-        self.debug("-> send( %s , %s , %s , %s )" % (repr(src), repr(dest), repr(packet), repr(addattrs)))
+        self.debug("-> send( %r , %r , %r , %r )", src, dest, packet, addattrs)
 
         # call recv on the local channel object
         retval = self.localch.tbm.recv(self.ipcore_ref, self.localch, packet, addattrs)
         
         # something to do with the retval? Only report it.
-        self.debug("-> send returns code '%s'" % repr(retval))
+        self.debug("-> send returns code '%r'", retval)
         return retval
     
     def recv(self, src, dest, packet, addattrs=None):
@@ -157,7 +165,7 @@ class basic_ipcore_tbm(noc_tbm_base):
         * In theory src should be self.localch, and dest should be 
           self.ipcore_ref . This may be checked for errors.
         """
-        self.debug("-> recv( %s , %s , %s , %s )" % (repr(src), repr(dest), repr(packet), repr(addattrs)))
+        self.debug("-> recv( %r , %r , %r , %r )", src, dest, packet, addattrs)
 
         # update signal
         self.incoming_packet.next = packet
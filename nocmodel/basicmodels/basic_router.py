@@ -43,9 +43,26 @@ from nocmodel.noc_tbm_base import *
 from nocmodel.noc_codegen_base import *
 from intercon_model import *
 
+from collections import deque
+
 # ---------------------------
 # Router TBM model
 
+class _routed_packet(object):
+    """
+    Packet wrapper used inside the router fifos. The destination address is 
+    extracted once, when the router receives the packet, and the original 
+    packet is handed back on send.
+    """
+    __slots__ = ("dst", "src", "raw")
+
+    def __init__(self, dst, src, raw):
+        self.dst = dst
+        self.src = src
+        self.raw = raw
+    def __repr__(self):
+        return repr(self.raw)
+
 class basic_router_tbm(noc_tbm_base):
     """
     TBM model of a NoC router. This router uses store-and-forward technique, 
@@ -57,18 +74,30 @@ class basic_router_tbm(noc_tbm_base):
     Attributes:
     * router_ref : base reference
     * fifo_len: max number of packets to hold in each port
+    * max_batch: max number of packets to route in one routing step
     
     Notes:
     * This model is completely behavioral.
     * See code comments to better understanding.
     """
-    def __init__(self, router_ref, fifo_len=5):
+    __slots__ = ("router_ref", "graph_ref", "fifo_len", "max_batch", 
+        "delay_route", "delay_outfromfifo", "delay_ipcorebus", "myaddress", 
+        "mynodecoord", "port_addrs", "_port_idx", "_fifo_in", "_fifo_out", 
+        "_fifo_in_event", "_fifo_out_event", "_channels", "idlesignal", 
+        "_arrival_count", "_routed_count", "_channel_by_addr", "_src_addr_by_channel", 
+        "_send_dispatch", "_recv_dispatch", "ports_info", 
+        "list_fifo_in_events", "list_fifo_out_events", 
+        "detailed_routingtable", "routingtable", "_primary_hop", "_alt_hops", 
+        "_local_port_idx", "_next_port", "_route_lut")
+
+    def __init__(self, router_ref, fifo_len=5, max_batch=16):
         noc_tbm_base.__init__(self)
         if isinstance(router_ref, router):
             self.router_ref = router_ref
             self.graph_ref = router_ref.graph_ref
-            self.logname = "Router '%s'" % router_ref.name
-            if router_ref.name == "":
+            if router_ref.name:
+                self.logname = "Router '%s'" % router_ref.name
+            else:
                 self.logname = "Router addr '%s'" % router_ref.address
         else:
             raise TypeError("This class needs a router object as constructor argument.")
@@ -76,10 +105,13 @@ class basic_router_tbm(noc_tbm_base):
         self.debug("constructor")
         
         # generic parameters
+        if max_batch < 1:
+            raise ValueError("Argument 'max_batch' must be greater than zero.")
         self.fifo_len = fifo_len
+        self.max_batch = max_batch
 
         # delay parameters
-        self.delay_route = 5        # delay for each routing decisition
+        self.delay_route = 5        # delay for each routing decisition (per packet)
         self.delay_outfromfifo = 2  # delay for extract packet from fifo to output port
         self.delay_ipcorebus = 1    # delay for ipcore local bus operations
         
@@ -87,38 +119,123 @@ class basic_router_tbm(noc_tbm_base):
         self.myaddress = router_ref.address
         self.mynodecoord = (router_ref.coord_x, router_ref.coord_y)
 
-        # port additions: use a copy of the ports list, and add
-        # fifo storage and signal events
+        # port additions: each port gets a compact index, and its fifo storage,
+        # signal events and channel are kept in parallel lists indexed by it.
+        # Ports are sorted by address, so the port scan order is always the
+        # same.
         router_ref.update_ports_info()
-        self.ports_info = router_ref.ports.copy()
-        for p in self.ports_info.itervalues():
-            p["fifo_in"] = []
-            p["fifo_out"] = []
-            p["fifo_in_event"] = myhdl.Signal(False)
-            p["fifo_out_event"] = myhdl.Signal(False)
+        self.port_addrs = sorted(router_ref.ports)
+        self._port_idx = {addr: i for i, addr in enumerate(self.port_addrs)}
+        nports = len(self.port_addrs)
+        # fifo_in is bounded by fifo_len. fifo_out is not bounded, because
+        # a failed send puts the packet back in it.
+        self._fifo_in = [deque(maxlen=fifo_len) for i in range(nports)]
+        self._fifo_out = [deque() for i in range(nports)]
+        self._fifo_in_event = [myhdl.Signal(False) for i in range(nports)]
+        self._fifo_out_event = [myhdl.Signal(False) for i in range(nports)]
+        self._channels = [router_ref.ports[addr]["channel"] for addr in self.port_addrs]
         self.idlesignal = myhdl.Signal(True)
+        # arrival counter: incremented on each recv(). The routing loop waits
+        # on this single signal instead of the fifo_in_event list, so packets
+        # arriving on several ports in the same step wake it only once.
+        self._arrival_count = myhdl.Signal(myhdl.intbv(0)[32:])
+        # routed counter: incremented on each batch moved to the fifo_out 
+        # lists. flush_fifo_out waits on it when all fifo_out are empty.
+        self._routed_count = myhdl.Signal(myhdl.intbv(0)[32:])
+        # cache for send(): router address to channel. Port keys are already
+        # the neighbor addresses.
+        self._channel_by_addr = dict(zip(self.port_addrs, self._channels))
+        # cache for recv(): source address for each incoming channel, keyed
+        # by id(channel). Channel endpoints don't change during simulation.
+        self._src_addr_by_channel = {}
+
+        # argument conversion tables for send() and recv(), by argument type
+        self._send_dispatch = {
+            int: self._send_to_addr, 
+            router: self._send_to_router, 
+            channel: self._send_to_channel}
+        self._recv_dispatch = {
+            int: self._recv_from_addr, 
+            router: self._recv_from_router, 
+            channel: self._recv_from_channel}
 
-        # extract a list of all fifo event signals
-        self.list_fifo_in_events = [i["fifo_in_event"] for i in self.ports_info.itervalues()]
-        self.list_fifo_out_events = [i["fifo_out_event"] for i in self.ports_info.itervalues()]
+        # ports_info: per-port view of the lists above, keyed by address
+        self.ports_info = {}
+        for i, addr in enumerate(self.port_addrs):
+            p = router_ref.ports[addr].copy()
+            p["fifo_in"] = self._fifo_in[i]
+            p["fifo_out"] = self._fifo_out[i]
+            p["fifo_in_event"] = self._fifo_in_event[i]
+            p["fifo_out_event"] = self._fifo_out_event[i]
+            self.ports_info[addr] = p
+
+        # list of all fifo event signals
+        self.list_fifo_in_events = self._fifo_in_event
+        self.list_fifo_out_events = self._fifo_out_event
 
         # the routing table is generated from the routes_info dict
         # key: its destination address
         # values: a list of ports where the package should send it. First element
         #    is the default option, next elements are alternate routes
         router_ref.update_routes_info()
-        self.detailed_routingtable = self.router_ref.routes_info.copy()
+        # (copy its entries: the router recycles them on each update)
+        self.detailed_routingtable = dict([(dest, [x.copy() for x in data]) 
+            for dest, data in self.router_ref.routes_info.items()])
         self.routingtable = {}
-        for dest, data in self.detailed_routingtable.iteritems():
+        for dest, data in self.detailed_routingtable.items():
             self.routingtable[dest] = [x["next"] for x in data]
-        # add route to myself
+
+        # routingtable split: the default next hop for each destination, 
+        # and a tuple with its alternate routes (only used when the default
+        # one is not a valid port)
+        self._primary_hop = {}
+        self._alt_hops = {}
+        for dest, hops in self.routingtable.items():
+            self._primary_hop[dest] = hops[0]
+            self._alt_hops[dest] = tuple(hops[1:])
+
+        # route to myself: the local port (the ipcore port address is the 
+        # router address). Kept in routingtable as a public view.
+        self._local_port_idx = self._port_idx.get(self.myaddress)
         self.routingtable[self.myaddress] = [self.myaddress]
+
+        # next port lookup used on each packet: destination address to the
+        # index of the port to use. Take the default option, or the first 
+        # alternate route that is a valid port.
+        self._next_port = {}
+        for dest, nextaddr in self._primary_hop.items():
+            if nextaddr in self._port_idx:
+                self._next_port[dest] = self._port_idx[nextaddr]
+                continue
+            for nextaddr in self._alt_hops[dest]:
+                if nextaddr in self._port_idx:
+                    self._next_port[dest] = self._port_idx[nextaddr]
+                    break
+            else:
+                self.warning("no valid port for destination %r (routes %r)", dest, self.routingtable[dest])
+        # packets for this router go straight to the local port
+        if self._local_port_idx is not None:
+            self._next_port[self.myaddress] = self._local_port_idx
+
+        # routing lookup: if destination addresses are small non-negative
+        # integers (by default they are router indexes), use a flat list 
+        # indexed by address instead of a dict. The list is only valid for 
+        # destinations >= 0 that are in the table: on any other destination
+        # the routing loop uses the _next_port dict (and its KeyError).
+        self._route_lut = self._next_port
+        addrs = list(self._next_port)
+        if addrs and all(isinstance(a, int) and a >= 0 for a in addrs):
+            lutsize = max(addrs) + 1
+            if lutsize <= 2*len(addrs) + 16:
+                self._route_lut = [None] * lutsize
+                for dest, nexti in self._next_port.items():
+                    self._route_lut[dest] = nexti
         
         # log interesting info
-        self.info(" router params: fifo_len=%d" % self.fifo_len)
-        self.info(" router info: addr=%d coord=%s" % (self.myaddress, repr(self.mynodecoord)))
-        self.info(" router ports: %s" % repr(self.ports_info))
-        self.info(" router routing table: %s" % repr(self.routingtable))
+        self.info(" router params: fifo_len=%d max_batch=%d", self.fifo_len, self.max_batch)
+        self.info(" router info: addr=%d coord=%r", self.myaddress, self.mynodecoord)
+        self.info(" router ports: %r", self.ports_info)
+        self.info(" router routing table: %r", self.routingtable)
 
         # myhdl generators (concurrent processes)
         self.generators = []
@@ -126,78 +243,161 @@ class basic_router_tbm(noc_tbm_base):
         # fifo out process
         @myhdl.instance
         def flush_fifo_out():
+            # local bindings for the per-packet loop
+            port_addrs = self.port_addrs
+            fifos_out = self._fifo_out
+            fifos_out_event = self._fifo_out_event
+            channels = self._channels
+            idlesignal = self.idlesignal
+            events = self.list_fifo_out_events
+            routed_count = self._routed_count
+            router_ref = self.router_ref
+            send = self.send
+            debug = self.debug
+            info = self.info
+            delay = myhdl.delay
+            err_ok = noc_tbm_errcodes.no_error
             while True:
-                for port, data in self.ports_info.iteritems():
-                    if len(data["fifo_out"]) > 0:
-                        self.idlesignal.next = False
-                        if not data["fifo_out_event"].val:
-                            self.debug("flush_fifo_out CATCH fifo not empty and NO trigger! fifo has %s" % repr(data["fifo_out"]))
-                        self.info("flush_fifo_out event in port %d" % port)
-                        packet = data["fifo_out"].pop(0)
-                        self.debug("flush_fifo_out port %d packet is %s (delay %d)" % (port, repr(packet), self.delay_outfromfifo))
+                for i in range(nports):
+                    port = port_addrs[i]
+                    fifo_out = fifos_out[i]
+                    fifo_out_event = fifos_out_event[i]
+                    if fifo_out:
+                        idlesignal.next = False
+                        if __debug__ and not fifo_out_event.val:
+                            debug("flush_fifo_out CATCH fifo not empty and NO trigger! fifo has %r", fifo_out)
+                        info("flush_fifo_out event in port %d", port)
+                        packet = fifo_out.popleft()
+                        debug("flush_fifo_out port %d packet is %r (delay %d)", port, packet, self.delay_outfromfifo)
                         # DELAY model: time to move from fifo to external port in destination object
-                        yield myhdl.delay(self.delay_outfromfifo)
-                        self.idlesignal.next = False
+                        yield delay(self.delay_outfromfifo)
+                        idlesignal.next = False
                         # try to send it
-                        retval = self.send(self.router_ref, data["channel"], packet)
-                        if retval == noc_tbm_errcodes.no_error:
-                            # clean trigger
-                            data["fifo_out_event"].next = False
-                            self.debug("flush_fifo_out clean trigger. list %s" % repr(self.list_fifo_out_events))
-                            #continue
+                        retval = send(router_ref, channels[i], packet.raw)
+                        if retval == err_ok:
+                            # clean trigger, only when the fifo is empty: the
+                            # routing loop may put several packets with one 
+                            # trigger
+                            if not fifo_out:
+                                fifo_out_event.next = False
+                                debug("flush_fifo_out clean trigger. list %r", events)
                         else:
-                            self.error("flush_fifo_out FAILED in port %d (code %d)" % (port, retval))
+                            self.error("flush_fifo_out FAILED in port %d (code %d)", port, retval)
                             # error management: 
                             #TODO: temporally put back to fifo
-                            self.info("flush_fifo_out packet went back to fifo.")
-                            data["fifo_out"].append(packet)
+                            info("flush_fifo_out packet went back to fifo.")
+                            fifo_out.append(packet)
                     else:
-                        if data["fifo_out_event"].val:
-                            self.debug("flush_fifo_out CATCH fifo_out empty and trigger ON! Cleaning trigger")
-                            data["fifo_out_event"].next = False
-                self.idlesignal.next = True
-                yield self.list_fifo_out_events
-                self.debug("flush_fifo_out event hit. list %s" % repr(self.list_fifo_out_events))
+                        if fifo_out_event.val:
+                            debug("flush_fifo_out CATCH fifo_out empty and trigger ON! Cleaning trigger")
+                            fifo_out_event.next = False
+                if any(fifos_out):
+                    # packets left: keep flushing
+                    continue
+                idlesignal.next = True
+                yield routed_count
+                debug("flush_fifo_out event hit. list %r", events)
 
         # routing loop
         @myhdl.instance
         def routing_loop():
+            # local bindings for the per-packet loop
+            port_addrs = self.port_addrs
+            fifos_in = self._fifo_in
+            fifos_in_event = self._fifo_in_event
+            fifos_out = self._fifo_out
+            fifos_out_event = self._fifo_out_event
+            route_lut = self._route_lut
+            next_port = self._next_port
+            max_batch = self.max_batch
+            idlesignal = self.idlesignal
+            events = self.list_fifo_in_events
+            arrival_count = self._arrival_count
+            routed_count = self._routed_count
+            debug = self.debug
+            info = self.info
+            delay = myhdl.delay
+            # first port to scan. After a full batch, the next scan starts 
+            # on the first port left with packets, so busy low-index ports
+            # can't starve the others.
+            start = 0
             while True:
-                # routing update: check all fifos
-                for port, data in self.ports_info.iteritems():
-                    while len(data["fifo_in"]) > 0:
-                        self.idlesignal.next = False
-                        if not data["fifo_in_event"].val:
-                            self.debug("routing_loop CATCH fifo not empty and NO trigger! fifo has %s" % repr(data["fifo_in"]))
-                        self.info("routing_loop fifo_in event in port %d" % port)
-                        # data in fifo
-                        packet = data["fifo_in"].pop(0)
-                        data["fifo_in_event"].next = False
-                        self.debug("routing_loop port %d packet %s to ipcore (delay %d)" % (port, repr(packet), self.delay_route))
-                        # destination needed. extract from routing table
-                        destaddr = packet["dst"]
-                        self.debug("routing_loop port %d routingtable %s (dest %d)" % (port, repr(self.routingtable), destaddr))
-                        nextaddr = self.routingtable[destaddr][0]
-                        self.debug("routing_loop port %d to port %s (dest %d)" % (port, nextaddr, destaddr))
-                        # DELAY model: time spent to make a route decisition
-                        yield myhdl.delay(self.delay_route)
-                        self.idlesignal.next = False
-                        self.ports_info[nextaddr]["fifo_out"].append(packet)
-                        # fifo trigger
-                        if self.ports_info[nextaddr]["fifo_out_event"]:
-                            self.debug("routing_loop CATCH possible miss event because port %d fifo_out_event=True", self.myaddress)
-                        self.ports_info[nextaddr]["fifo_out_event"].next = True
-                    # assuming empty fifo_in
-                    if data["fifo_in_event"].val:
-                        self.debug("routing_loop CATCH fifo_in empty and trigger ON! Cleaning trigger")
-                        data["fifo_in_event"].next = False
-                self.idlesignal.next = True
-                self.debug("routing_loop idle. fifo_in_events list %s" % repr(self.list_fifo_in_events))
-                if not any(self.list_fifo_in_events):
-                    yield self.list_fifo_in_events
+                # routing update: drain all fifos (up to max_batch packets) 
+                # and take all its routing decisions at once
+                batch = []
+                resume = None
+                for k in range(nports):
+                    i = (start + k) % nports
+                    port = port_addrs[i]
+                    fifo_in = fifos_in[i]
+                    fifo_in_event = fifos_in_event[i]
+                    if fifo_in:
+                        if len(batch) == max_batch:
+                            # full batch. Remaining packets go in the next one
+                            if resume is None:
+                                resume = i
+                            continue
+                        if __debug__ and not fifo_in_event.val:
+                            debug("routing_loop CATCH fifo not empty and NO trigger! fifo has %r", fifo_in)
+                        info("routing_loop fifo_in event in port %d", port)
+                        # data in fifo: take as many packets as the batch allows
+                        for j in range(min(len(fifo_in), max_batch - len(batch))):
+                            batch.append(fifo_in.popleft())
+                        # only one trigger update per port, once drained
+                        if not fifo_in:
+                            fifo_in_event.next = False
+                        elif resume is None:
+                            resume = i
+                    elif fifo_in_event.val:
+                        # assuming empty fifo_in
+                        debug("routing_loop CATCH fifo_in empty and trigger ON! Cleaning trigger")
+                        fifo_in_event.next = False
+                start = resume if resume is not None else 0
+                if batch:
+                    idlesignal.next = False
+                    # destinations needed. Extract all next ports from the 
+                    # routing lookup in one pass
+                    dsts = [packet.dst for packet in batch]
+                    if route_lut is next_port:
+                        nextports = [next_port[dst] for dst in dsts]
+                    else:
+                        try:
+                            nextports = [route_lut[dst] for dst in dsts]
+                        except (IndexError, TypeError):
+                            nextports = None
+                        if nextports is None or None in nextports or min(dsts) < 0:
+                            # destination not in the list: the dict raises
+                            # the lookup error
+                            nextports = [next_port[dst] for dst in dsts]
+                    batch = list(zip(nextports, batch))
+                    for nexti, packet in batch:
+                        debug("routing_loop packet %r to port %s (dest %d)", packet, port_addrs[nexti], packet.dst)
+                    # DELAY model: time spent to make the routing decisitions
+                    debug("routing_loop routed %d packets (delay %d)", len(batch), self.delay_route * len(batch))
+                    yield delay(self.delay_route * len(batch))
+                    idlesignal.next = False
+                    dirty = [False] * nports
+                    for nexti, packet in batch:
+                        fifos_out[nexti].append(packet)
+                        dirty[nexti] = True
+                    # fifo trigger: once per output port and batch. This 
+                    # relies on the flush_fifo_out contract: a trigger stays 
+                    # high while its fifo_out is non-empty, and the flush 
+                    # loop keeps draining until all fifo_out are empty (it
+                    # only waits on routed_count after that).
+                    for i in range(nports):
+                        if dirty[i]:
+                            fifos_out_event[i].next = True
+                    routed_count.next = (routed_count.val + 1) & 0xffffffff
+                    # check again: new packets may arrive during the delay
+                    continue
+                idlesignal.next = True
+                debug("routing_loop idle. fifo_in_events list %r", events)
+                if not any(fifos_in):
+                    yield arrival_count
                 else:
-                    self.debug("routing_loop pending fifo_in_events list %s" % repr(self.list_fifo_in_events))
-                self.debug("routing_loop fifo_in event hit. list %s" % repr(self.list_fifo_in_events))
+                    debug("routing_loop pending fifo_in_events list %r", events)
+                debug("routing_loop fifo_in event hit. list %r", events)
 
         # list of all generators
         self.generators.extend([flush_fifo_out, routing_loop])
@@ -213,30 +413,23 @@ class basic_router_tbm(noc_tbm_base):
         * dest should be a channel object, but also can be a router address or
           a router object.
         """
-        self.debug("-> send( %s , %s , %s , %s )" % (repr(src), repr(dest), repr(packet), repr(addattrs)))
-        if isinstance(dest, int):
-            # it means dest is a router address
-            therouter = self.graph_ref.get_router_by_address(dest)
-            if therouter == False:
-                self.error("-> send: dest %s not found" % repr(dest) )
+        self.debug("-> send( %r , %r , %r , %r )", src, dest, packet, addattrs)
+        # dest can be an address or a noc object: convert to a channel
+        handler = self._send_dispatch.get(type(dest))
+        if handler is None:
+            handler = self._find_handler(self._send_dispatch, dest)
+            if handler is None:
+                self.error("-> send: what is dest '%r'?", dest)
                 return noc_tbm_errcodes.tbm_badcall_send
-            # extract channel ref from ports_info
-            thedest = self.ports_info[therouter.address]["channel"]
-        elif isinstance(dest, router):
-            # extract channel ref from ports_info
-            thedest = self.ports_info[dest.address]["channel"]
-        elif isinstance(dest, channel):
-            # use it directly
-            thedest = dest
-        else:
-            self.error("-> send: what is dest '%s'?" % repr(dest) )
+        thedest = handler(dest)
+        if thedest is None:
             return noc_tbm_errcodes.tbm_badcall_send
 
         # call recv on the dest channel object
         retval = thedest.tbm.recv(self.router_ref, thedest, packet, addattrs)
 
         # TODO: something to do with the retval?
-        self.debug("-> send returns code '%s'" % repr(retval))
+        self.debug("-> send returns code '%r'", retval)
         return retval
     
     def recv(self, src, dest, packet, addattrs=None):
@@ -248,47 +441,100 @@ class basic_router_tbm(noc_tbm_base):
         * Ignore dest object.
         """
         
-        self.debug("-> recv( %s , %s , %s , %s )" % (repr(src), repr(dest), repr(packet), repr(addattrs)))
+        self.debug("-> recv( %r , %r , %r , %r )", src, dest, packet, addattrs)
         # src can be an address or a noc object.
         # convert to addresses
-        if isinstance(src, int):
-            thesrc = src
-        elif isinstance(src, router):
-            thesrc = src.address
-        elif isinstance(src, channel):
-            # get address from the other end. Use the endpoints to calculate
-            # source router
-            src_index = src.endpoints.index(self.router_ref) - 1
-            theend = src.endpoints[src_index]
-            if isinstance(theend, router):
-                thesrc = theend.address
-            elif isinstance(theend, ipcore):
-                thesrc = theend.router_ref.address
-            else:
-                self.error("-> recv: what is endpoint '%s' in channel '%s'?" % (repr(theend), repr(src)) )
+        handler = self._recv_dispatch.get(type(src))
+        if handler is None:
+            handler = self._find_handler(self._recv_dispatch, src)
+            if handler is None:
+                self.error("-> recv: what is src '%r'?", src)
                 return noc_tbm_errcodes.tbm_badcall_recv
-        else:
-            self.error("-> recv: what is src '%s'?" % repr(src) )
+        thesrc = handler(src)
+        if thesrc is None:
             return noc_tbm_errcodes.tbm_badcall_recv
 
         # thesrc becomes the port number
-        # check if there is enough space on the FIFO
-        if len(self.ports_info[thesrc]["fifo_in"]) == self.fifo_len:
+        i = self._port_idx[thesrc]
+        fifo_in = self._fifo_in[i]
+        # check if there is enough space on the FIFO. Must be done before
+        # append: a full deque would silently drop its oldest packet
+        if len(fifo_in) >= fifo_in.maxlen:
             # full FIFO
             self.error("-> recv: full fifo. Try later.")
-            self.debug("-> recv: port %s fifo_in contents: %s" % (thesrc, repr(self.ports_info[thesrc]["fifo_in"])))
+            self.debug("-> recv: port %s fifo_in contents: %r", thesrc, fifo_in)
             return noc_tbm_errcodes.full_fifo
         # get into fifo
-        self.ports_info[thesrc]["fifo_in"].append(packet)
+        fifo_in.append(_routed_packet(packet["dst"], thesrc, packet))
         # trigger a new routing event
-        if self.ports_info[thesrc]["fifo_in_event"].val:
+        if self._fifo_in_event[i].val:
             self.debug("-> recv: CATCH possible miss event because in port %d fifo_in_event=True", thesrc)
-            self.debug("-> recv: CATCH fifo_in_event list %s" % repr(self.list_fifo_in_events))
-        self.ports_info[thesrc]["fifo_in_event"].next = True
+            self.debug("-> recv: CATCH fifo_in_event list %r", self.list_fifo_in_events)
+        self._fifo_in_event[i].next = True
+        self._arrival_count.next = (self._arrival_count.val + 1) & 0xffffffff
 
         self.debug("-> recv returns 'noc_tbm_errcodes.no_error'")
         return noc_tbm_errcodes.no_error
 
+    # send() and recv() argument conversion: one handler for each type of
+    # argument, selected with _send_dispatch and _recv_dispatch tables.
+    def _find_handler(self, dispatch, obj):
+        """
+        Search a handler for an object whose type is not in the dispatch 
+        table (e.g. a derived class), and add its type to the table.
+        """
+        for basetype, handler in dispatch.items():
+            if isinstance(obj, basetype):
+                dispatch[type(obj)] = handler
+                return handler
+        return None
+
+    def _send_to_addr(self, dest):
+        # dest is a router address. Search the NoC model only the first 
+        # time, then remember its channel
+        thedest = self._channel_by_addr.get(dest)
+        if thedest is None:
+            therouter = self.graph_ref.get_router_by_address(dest)
+            if therouter is None:
+                self.error("-> send: dest %r not found", dest)
+                return None
+            # extract channel ref from port lists
+            thedest = self._channels[self._port_idx[therouter.address]]
+            self._channel_by_addr[dest] = thedest
+        return thedest
+
+    def _send_to_router(self, dest):
+        # extract channel ref from port lists
+        return self._channels[self._port_idx[dest.address]]
+
+    def _send_to_channel(self, dest):
+        # use it directly
+        return dest
+
+    def _recv_from_addr(self, src):
+        return src
+
+    def _recv_from_router(self, src):
+        return src.address
+
+    def _recv_from_channel(self, src):
+        thesrc = self._src_addr_by_channel.get(id(src))
+        if thesrc is not None:
+            return thesrc
+        # get address from the other end. Use the endpoints to calculate
+        # source router
+        src_index = src.endpoints.index(self.router_ref) - 1
+        theend = src.endpoints[src_index]
+        if isinstance(theend, router):
+            thesrc = theend.address
+        elif isinstance(theend, ipcore):
+            thesrc = theend.router_ref.address
+        else:
+            self.error("-> recv: what is endpoint '%r' in channel '%r'?", theend, src)
+            return None
+        self._src_addr_by_channel[id(src)] = thesrc
+        return thesrc
+
 # ---------------------------
 # Router code generation model
 
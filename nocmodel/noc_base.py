@@ -53,24 +53,77 @@ from myhdl import Signal, SignalType, intbv, bin
 from collections import OrderedDict
 from math import ceil as mathceil
 
+try:
+    _integer_types = (int, long)
+except NameError:
+    # Python 3
+    _integer_types = (int,)
+
 class noc(nx.Graph):
     """
     Base class for NoC modeling.
     Based on a Graph object that hold the NoC structure
     
     Arguments
+    * data: optional graph data to initialize the NoC structure
     * kwargs: optional parameters to put as object attributes
+
+    Notes:
+    * Only the graph methods common to NetworkX 1.x and 2.x are used.
     """
-    def __init__(self, **kwargs):
+    def __init__(self, data=None, **kwargs):
         """
         NoCmodel constructor
         """
-        nx.Graph.__init__(self, **kwargs)
+        # data argument is positional: its name differs between NetworkX 
+        # versions
+        nx.Graph.__init__(self, data, **kwargs)
         if not hasattr(self, "name"):
             self.name = ""
         if not hasattr(self, "description"):
             self.description = ""
-        
+        # shortest paths cache, shared by all routers
+        # predecessors: key is the destination node
+        # paths: key is the tuple (source node, destination node)
+        self._predecessor_cache = {}
+        self._shortest_paths_cache = {}
+        # number of shortest paths to the destination node, from the same 
+        # search as the predecessors. Key is the destination node
+        self._path_count_cache = {}
+        # router index by address
+        self._address_index = {}
+        # router by node (same as node attribute "router_ref")
+        self._router_by_idx = {}
+        # channel index for each edge. Key is frozenset((node1, node2)).
+        # Edges that come from the constructor data get its position.
+        self._edge_index_map = {}
+        for i, edge in enumerate(self.edges()):
+            self._edge_index_map[frozenset(edge)] = i
+        # next node and edge indexes
+        self._next_nodeidx = self.number_of_nodes()
+        self._next_edgeidx = len(self._edge_index_map)
+        # topology version: changes on each change of the NoC objects
+        self._topo_version = 0
+        # cached object lists: key is the list kind, value is the tuple 
+        # (topology version, list)
+        self._cached_lists = {}
+        # single path cache, for routes that avoid some links. Its entries 
+        # belong to topology version _path_cache_version
+        self._path_cache = {}
+        self._path_cache_version = 0
+        self._path_cache_maxlen = 4096
+        
+    # protocol_ref: default protocol for all objects. Changing it clears 
+    # the protocol references cached by the objects.
+    @property
+    def protocol_ref(self):
+        return self.__dict__.get("_protocol_ref", None)
+
+    @protocol_ref.setter
+    def protocol_ref(self, value):
+        self.__dict__["_protocol_ref"] = value
+        self.invalidate_protocol_cache()
+
     def __repr__(self):
         if self.name != "":
             return "<%s '%s'>" % (self.__class__.__name__, self.name)
@@ -100,6 +153,34 @@ class noc(nx.Graph):
             self.add_ipcore(retval)
         return retval
     
+    def add_routers(self, count, with_ipcores=False, name_fmt="R_%d"):
+        """
+        Create several base router objects and add them to NoC model.
+
+        Arguments
+        * count: number of routers to create
+        * with_ipcores: If True, add an ipcore to each created router.
+        * name_fmt: name format for the routers, with its index as argument
+
+        Return: list of references to the created router objects
+
+        Notes:
+        * Equivalent to count calls to add_router(), but the nodes are 
+          inserted at once and the NoC caches are invalidated only once.
+        """
+        start = self._next_nodeidx
+        self._next_nodeidx += count
+        routers = [router(index=idx, name=name_fmt % idx, graph_ref=self) 
+            for idx in range(start, start + count)]
+        self.add_nodes_from((r.index, {"router_ref": r}) for r in routers)
+        for r in routers:
+            self._router_by_idx[r.index] = r
+            self._address_index[r.address] = r
+            if with_ipcores:
+                self._new_ipcore(r, "")
+        self.invalidate_route_cache()
+        return routers
+
     def add_router_from_object(self, router_ref):
         """
         Add an existing router object to NoC model.
@@ -124,6 +205,9 @@ class noc(nx.Graph):
         # don't forget that index is used for address
         router_ref.address = router_ref.index
         self.add_node(router_ref.index, router_ref=router_ref)
+        self._router_by_idx[router_ref.index] = router_ref
+        self._address_index[router_ref.address] = router_ref
+        self.invalidate_route_cache()
         return router_ref
 
     def add_channel(self, router1, router2, name="", **kwargs):
@@ -148,18 +232,7 @@ class noc(nx.Graph):
         rhash = [None, None]
         rrefs = [None, None]
         for targetid, routertarget in enumerate((router1, router2)):
-            if isinstance(routertarget, router):
-                if routertarget.index in self.node:
-                    rhash[targetid] = routertarget.index
-                    rrefs[targetid] = self.node[routertarget.index]["router_ref"]
-            elif isinstance(routertarget, ipcore):
-                # special channel
-                rhash[targetid] = None
-                rrefs[targetid] = routertarget
-            elif isinstance(routertarget, int):
-                if routertarget in self.node:
-                    rhash[targetid] = routertarget
-                    rrefs[targetid] = self.node[routertarget]["router_ref"]
+            rhash[targetid], rrefs[targetid] = self._resolve_endpoint(routertarget)
 
         if rrefs[0] is None:
             raise ValueError("Object not found for argument 'router1'")
@@ -180,6 +253,8 @@ class noc(nx.Graph):
                 name = "CH_%s:%s" % (rrefs[0].name, rrefs[1].name)
             channelnode = channel(index=self._get_next_edgeidx(), name=name, graph_ref=self, **kwargs)
             self.add_edge(rhash[0], rhash[1], channel_ref = channelnode)
+            self._edge_index_map[frozenset((rhash[0], rhash[1]))] = channelnode.index
+            self.invalidate_route_cache()
         channelnode.endpoints = rrefs
         return channelnode
     
@@ -220,33 +295,23 @@ class noc(nx.Graph):
         rhash = [None, None]
         rrefs = [None, None]
         for targetid, routertarget in enumerate((router1, router2)):
-            if isinstance(routertarget, router):
-                if routertarget.index in self.node:
-                    rhash[targetid] = routertarget.index
-                    rrefs[targetid] = self.node[routertarget.index]["router_ref"]
-            elif isinstance(routertarget, ipcore):
-                # special channel
-                rhash[targetid] = None
-                rrefs[targetid] = routertarget
-            elif isinstance(routertarget, int):
-                if routertarget in self.node:
-                    rhash[targetid] = routertarget
-                    rrefs[targetid] = self.node[routertarget]["router_ref"]
+            rhash[targetid], rrefs[targetid] = self._resolve_endpoint(routertarget)
 
         if (router1 is None) and (router2 is None):
             # extract from endpoints attribute
             if not hasattr(channel_ref, "endpoints"):
                 raise ValueError("Channel object has not attribute 'endpoints'")
             for i in range(2):
-                if not isinstance(channel_ref.endpoints[i], [router, ipcore]):
-                    raise ValueError("Channel object: attribute 'endpoints'[%d] is not a router or an ipcore" % i)
-                if isinstance(channel_ref.endpoints[i], router):
-                    if channel_ref.endpoints[i].index in self.node:
-                        rhash[i] = channel_ref.endpoints[i].index
-                        rrefs[i] = channel_ref.endpoints[i]
-                if isinstance(channel_ref.endpoints[i], ipcore):
+                endpoint = channel_ref.endpoints[i]
+                if isinstance(endpoint, router):
+                    if self.has_node(endpoint.index):
+                        rhash[i] = endpoint.index
+                        rrefs[i] = endpoint
+                elif isinstance(endpoint, ipcore):
                     rhash[i] = None
-                    rrefs[i] = channel_ref.endpoints[i]
+                    rrefs[i] = endpoint
+                else:
+                    raise ValueError("Channel object: attribute 'endpoints'[%d] is not a router or an ipcore" % i)
 
         if rrefs[0] is None:
             raise ValueError("Object not found for argument 'router1'")
@@ -260,10 +325,13 @@ class noc(nx.Graph):
             rrefs[ipcore_idx].channel_ref = channel_ref
             # the other reference must be a router object
             rrefs[ipcore_idx - 1].ipcore_ref = rrefs[ipcore_idx]
+            self._topology_changed()
         else:
             # inter-routers channel
             channel_ref.index = self._get_next_edgeidx()
             self.add_edge(rhash[0], rhash[1], channel_ref=channel_ref)
+            self._edge_index_map[frozenset((rhash[0], rhash[1]))] = channel_ref.index
+            self.invalidate_route_cache()
         # update common references
         channel_ref.graph_ref = self
         channel_ref.endpoints = rrefs
@@ -288,16 +356,8 @@ class noc(nx.Graph):
         """
         if router_ref not in self.router_list():
             raise ValueError("Argument 'router_ref' must be an existing router.")
-        if name == "":
-            # channel default name format 
-            name = "IP_%d" % router_ref.index
-        # fix channel name, based on ipcore name
-        chname = "CH_%s" % name
-        newip = ipcore(name=name, router_ref=router_ref, graph_ref=self, **kwargs)
-        channelnode = channel(index=None, name=chname, graph_ref=self, endpoints=[router_ref, newip])
-        # fix references
-        newip.channel_ref = channelnode
-        router_ref.ipcore_ref = newip
+        newip = self._new_ipcore(router_ref, name, **kwargs)
+        self._topology_changed()
         return newip
     
     def add_from_ipcore(self, ipcore_ref, router_ref, channel_ref=None):
@@ -321,7 +381,7 @@ class noc(nx.Graph):
         if router_ref not in self.router_list():
             raise ValueError("Argument 'router_ref' must be an existing router.")
 
-        if channel_ref != None:
+        if channel_ref is not None:
             if not isinstance(channel_ref, channel):
                 raise ValueError("Argument 'channel_ref' is not a channel object.")
             else:
@@ -338,6 +398,7 @@ class noc(nx.Graph):
         ipcore_ref.channel_ref = channel_ref
         ipcore_ref.graph_ref = self
         router_ref.ipcore_ref = ipcore_ref
+        self._topology_changed()
         
         return ipcore_ref
 
@@ -366,49 +427,180 @@ class noc(nx.Graph):
         pass
 
     # list generation functions
+    # Object lists are cached, and rebuilt only when the topology version 
+    # changes. Each function returns a copy of the cached list.
     def router_list(self):
-        l = []
-        for i in self.nodes_iter(data=True):
-            r = i[1].get("router_ref", None)
-            if r is not None:
-                l.append(r)
-        return l
+        return list(self._cached_list("router"))
 
     def ipcore_list(self):
-        l = []
-        for i in self.router_list():
-            ip = getattr(i, "ipcore_ref", None)
-            if ip is not None:
-                l.append(ip)
-        return l
+        return list(self._cached_list("ipcore"))
 
     def channel_list(self, with_ipcore_channel=False):
-        l = []
-        for i in self.edges_iter(data=True):
-            ch = i[2].get("channel_ref", None)
-            if ch is not None:
-                l.append(ch)
         if with_ipcore_channel:
-            for i in self.ipcore_list():
-                ch = getattr(i, "channel_ref", None)
-                if ch is not None:
-                    l.append(ch)
-        return l
+            return list(self._cached_list("channel_ipcore"))
+        return list(self._cached_list("channel"))
 
     def all_list(self, with_ipcore_channel=False):
-        l = self.router_list()
-        l.extend(self.ipcore_list())
-        l.extend(self.channel_list(with_ipcore_channel))
-        return l
+        if with_ipcore_channel:
+            chlist = self._cached_list("channel_ipcore")
+        else:
+            chlist = self._cached_list("channel")
+        return self._cached_list("router") + self._cached_list("ipcore") + chlist
 
     # query functions
+    def get_shortest_paths(self, src, dst):
+        """
+        Return a list of all shortest paths between nodes src and dst.
+        
+        Notes:
+        * Results are cached at NoC level: the predecessors for each 
+          destination are calculated only once, and reused by all routers.
+        * The cache is cleared when the NoC model changes through this class
+          methods. Call invalidate_route_cache() after changing the graph
+          by other means.
+        """
+        paths = self._shortest_paths_cache.get((src, dst))
+        if paths is None:
+            paths = all_shortest_paths(self, src, dst, self.get_predecessors(dst))
+            self._shortest_paths_cache[(src, dst)] = paths
+        return paths
+
+    def get_predecessors(self, dst):
+        """
+        Return the result of nx.predecessor(self, dst): the predecessors of 
+        each node in a breadth-first search started at node dst.
+        
+        Notes:
+        * Cached at NoC level until the next topology change. The cached 
+          predecessor lists are stored as tuples (smaller, and read-only).
+        """
+        pred = self._predecessor_cache.get(dst)
+        if pred is None:
+            pred = self._dest_bfs(dst)[0]
+        return pred
+
+    def get_path_counts(self, dst):
+        """
+        Return the number of shortest paths from each node to node dst.
+        
+        Return: a dict with nodes as keys, and the number of paths as 
+        values (1 for dst). Nodes that can't reach dst are not included.
+        
+        Notes:
+        * Calculated during the breadth-first search of get_predecessors(), 
+          so the paths are never enumerated. Cached at NoC level until the 
+          next topology change.
+        """
+        counts = self._path_count_cache.get(dst)
+        if counts is None:
+            counts = self._dest_bfs(dst)[1]
+        return counts
+
+    def get_shortest_path(self, src, dst, excluded_links=()):
+        """
+        Return one shortest path between nodes src and dst that doesn't use
+        any of the excluded links.
+        
+        Arguments:
+        * src: source node
+        * dst: destination node
+        * excluded_links: optional list of links (node pairs) to avoid, e.g.
+          disabled or congested links.
+        
+        Return: a list of nodes from src to dst, or None if dst is not 
+        reachable.
+        
+        Notes:
+        * Results are cached by (src, dst, excluded links) for the current
+          topology version. When the cache reaches _path_cache_maxlen 
+          entries it starts over.
+        """
+        if self._path_cache_version != self._topo_version:
+            self._path_cache.clear()
+            self._path_cache_version = self._topo_version
+        excluded = frozenset(frozenset(link) for link in excluded_links)
+        key = (src, dst, excluded)
+        if key in self._path_cache:
+            return self._path_cache[key]
+        # breadth-first search from src, skipping excluded links
+        parent = {src: None}
+        frontier = [src]
+        while frontier and dst not in parent:
+            nextfrontier = []
+            for n in frontier:
+                for m in self.adj[n]:
+                    if m in parent or frozenset((n, m)) in excluded:
+                        continue
+                    parent[m] = n
+                    nextfrontier.append(m)
+            frontier = nextfrontier
+        if dst in parent:
+            path = [dst]
+            while path[-1] != src:
+                path.append(parent[path[-1]])
+            path.reverse()
+        else:
+            path = None
+        if len(self._path_cache) >= self._path_cache_maxlen:
+            self._path_cache.clear()
+        self._path_cache[key] = path
+        return path
+
     def get_router_by_address(self, address):
+        """
+        Search a router by its address.
+        
+        Return: the router object, or None if not found.
+        """
+        r = self._address_index.get(address)
+        if r is not None and r.address == address:
+            return r
+        # address changed without set_router_address(): search and update
+        # the index
         for r in self.router_list():
             if r.address == address:
+                self._address_index[address] = r
                 return r
-        return False
+        return None
+        
+    def set_router_address(self, router_ref, address):
+        """
+        Change the address of a router in the NoC model.
+        
+        Arguments:
+        * router_ref: reference to an existing router
+        * address: its new address
+        
+        Notes:
+        * Use this method instead of changing router_ref.address directly,
+          so the address index stays up to date.
+        """
+        if self._address_index.get(router_ref.address) is router_ref:
+            del self._address_index[router_ref.address]
+        router_ref.address = address
+        self._address_index[address] = router_ref
+        # ports and routes use addresses
+        self._topology_changed()
         
     # update functions
+    def invalidate_route_cache(self):
+        """
+        Clear the shortest paths cache. Must be called after any change 
+        in the NoC topology.
+        """
+        self._topology_changed()
+        self._predecessor_cache.clear()
+        self._shortest_paths_cache.clear()
+        self._path_count_cache.clear()
+
+    def invalidate_protocol_cache(self):
+        """
+        Clear the protocol reference cached by each object. Must be called 
+        after changing the protocol_ref attribute of an object.
+        """
+        for obj in self.all_list(True):
+            obj.invalidate_protocol_cache()
+
     def update_nocdata(self):
         for r in self.router_list():
             r.update_ports_info()
@@ -433,7 +625,10 @@ class noc(nx.Graph):
             routernode = router_ref
             routernode.index = node
             routernode.graph_ref = self
-        self.node[node]["router_ref"] = routernode
+        self.add_node(node, router_ref=routernode)
+        self._router_by_idx[node] = routernode
+        self._address_index[routernode.address] = routernode
+        self._topology_changed()
         return routernode
 
     def _add_channel_from_edge(self, edge, name="", channel_ref=None, **kwargs):
@@ -442,8 +637,13 @@ class noc(nx.Graph):
         on an existing edge on graph object.
         """
         # inter-routers channels only
-        rrefs = [self.node[edge[0]]["router_ref"], self.node[edge[1]]["router_ref"]]
-        chindex = self.edges().index(edge)
+        rrefs = [self._router_by_idx[edge[0]], self._router_by_idx[edge[1]]]
+        edgekey = frozenset(edge[:2])
+        chindex = self._edge_index_map.get(edgekey)
+        if chindex is None:
+            # edge added outside noc methods
+            chindex = self._get_next_edgeidx()
+            self._edge_index_map[edgekey] = chindex
         if channel_ref is None:
             if name == "":
                 # channel default name format 
@@ -457,30 +657,144 @@ class noc(nx.Graph):
             channelnode.graph_ref = self
         channelnode.endpoints = rrefs
         self.get_edge_data(edge[0], edge[1])["channel_ref"] = channelnode
+        self.invalidate_route_cache()
 
         return channelnode
 
+    def _new_ipcore(self, router_ref, name="", **kwargs):
+        # create an ipcore and its channel, and connect them to router_ref
+        if name == "":
+            # channel default name format 
+            name = "IP_%d" % router_ref.index
+        # fix channel name, based on ipcore name
+        chname = "CH_%s" % name
+        newip = ipcore(name=name, router_ref=router_ref, graph_ref=self, **kwargs)
+        channelnode = channel(index=None, name=chname, graph_ref=self, endpoints=[router_ref, newip])
+        # fix references
+        newip.channel_ref = channelnode
+        router_ref.ipcore_ref = newip
+        return newip
+
+    def _resolve_endpoint(self, obj):
+        """
+        Resolve a channel endpoint argument (router, router index or ipcore)
+        
+        Return: tuple (node, object reference). Node is None for ipcores, 
+        and both are None if the object is not found.
+        """
+        t = type(obj)
+        # fast paths for the base classes
+        if t is router:
+            idx = obj.index
+        elif t is ipcore:
+            # special channel
+            return (None, obj)
+        elif t is int:
+            idx = obj
+        # derived classes
+        elif isinstance(obj, router):
+            idx = obj.index
+        elif isinstance(obj, ipcore):
+            return (None, obj)
+        elif isinstance(obj, int):
+            idx = obj
+        else:
+            return (None, None)
+        ref = self._router_by_idx.get(idx)
+        if ref is None:
+            return (None, None)
+        return (idx, ref)
+
+    def _dest_bfs(self, dst):
+        # breadth-first search from dst: predecessors (same lists and order
+        # as nx.predecessor() ) and number of shortest paths of each reached
+        # node. Both results are cached.
+        adj = self.adj
+        pred = {dst: []}
+        counts = {dst: 1}
+        dist = {dst: 0}
+        level = [dst]
+        while level:
+            nextlevel = []
+            for n in level:
+                nextdist = dist[n] + 1
+                for m in adj[n]:
+                    if m not in dist:
+                        dist[m] = nextdist
+                        pred[m] = [n]
+                        nextlevel.append(m)
+                    elif dist[m] == nextdist:
+                        pred[m].append(n)
+            # the predecessors of the next level are complete: add up its 
+            # path counts
+            for m in nextlevel:
+                counts[m] = sum([counts[p] for p in pred[m]])
+            level = nextlevel
+        # store predecessors as tuples (smaller, and read-only in the cache)
+        pred = dict([(n, tuple(p)) for n, p in pred.items()])
+        self._predecessor_cache[dst] = pred
+        self._path_count_cache[dst] = counts
+        return pred, counts
+
+    def _topology_changed(self):
+        # new topology version: cached object lists will be rebuilt
+        self._topo_version += 1
+
+    def _cached_list(self, kind):
+        # return the cached list for kind "router", "ipcore", "channel" or 
+        # "channel_ipcore". Don't modify it.
+        cached = self._cached_lists.get(kind)
+        if cached is not None and cached[0] == self._topo_version:
+            return cached[1]
+        if kind == "router":
+            l = [d["router_ref"] for n, d in self.nodes(data=True) 
+                if d.get("router_ref", None) is not None]
+        elif kind == "ipcore":
+            l = [r.ipcore_ref for r in self._cached_list("router") 
+                if getattr(r, "ipcore_ref", None) is not None]
+        elif kind == "channel":
+            l = [d["channel_ref"] for n1, n2, d in self.edges(data=True) 
+                if d.get("channel_ref", None) is not None]
+        elif kind == "channel_ipcore":
+            l = self._cached_list("channel") + [ip.channel_ref 
+                for ip in self._cached_list("ipcore") 
+                if getattr(ip, "channel_ref", None) is not None]
+        else:
+            raise ValueError("Unknown list kind '%s'" % kind)
+        self._cached_lists[kind] = (self._topo_version, l)
+        return l
+
     def _get_next_nodeidx(self):
         # get the next node index number
         # don't use intermediate available indexes
-        return len(self.nodes())
+        idx = self._next_nodeidx
+        self._next_nodeidx += 1
+        return idx
 
     def _get_next_edgeidx(self):
         # get the next edge index number
         # don't use intermediate available indexes
-        return len(self.edges())
+        idx = self._next_edgeidx
+        self._next_edgeidx += 1
+        return idx
 
 # *******************************
 # Generic models for NoC elements
 # *******************************
 
-class nocobject():
+class nocobject(object):
     """
     NoC base object
     
     This base class is used to implement common methods for NoC objects.
     Don't use directly.
+    
+    Notes:
+    * This class and its derived classes declare __slots__ for its attributes.
+      Other attributes (e.g. from constructor kwargs) can still be added, 
+      they are stored in __dict__.
     """
+    __slots__ = ("graph_ref", "protocol_ref", "_cached_protocol", "__dict__")
     name = ""
     description = ""
     
@@ -493,14 +807,28 @@ class nocobject():
     def get_protocol_ref(self):
         """
         Get protocol object for this instance
+        
+        Notes:
+        * The resolved reference is cached. Call invalidate_protocol_cache() 
+          after changing protocol_ref on this object.
         """
-        if hasattr(self, "protocol_ref"):
-            if isinstance(self.protocol_ref, protocol):
-                return self.protocol_ref
-        if isinstance(self.graph_ref.protocol_ref, protocol):
-            return self.graph_ref.protocol_ref
-        # nothing?
-        return None
+        p = self._cached_protocol
+        if p is not None:
+            return p
+        p = getattr(self, "protocol_ref", None)
+        if not isinstance(p, protocol):
+            p = getattr(self.graph_ref, "protocol_ref", None)
+            if not isinstance(p, protocol):
+                # nothing?
+                return None
+        self._cached_protocol = p
+        return p
+
+    def invalidate_protocol_cache(self):
+        """
+        Forget the cached protocol reference
+        """
+        self._cached_protocol = None
 
     def get_address(self):
         """
@@ -541,6 +869,8 @@ class ipcore(nocobject):
     * channel_ref: optional reference to its related channel
     * graph_ref: optional reference to its graph model
     """
+    __slots__ = ("name", "router_ref", "channel_ref", "ports")
+
     def __init__(self, name, **kwargs):
         # Basic properties
         self.name = name
@@ -548,6 +878,7 @@ class ipcore(nocobject):
         self.router_ref = None
         self.channel_ref = None
         self.graph_ref = None
+        self._cached_protocol = None
         for key in kwargs.keys():
             setattr(self, key, kwargs[key])
         # ports structure
@@ -597,6 +928,17 @@ class router(nocobject):
     * ipcore_ref: optional reference to its related ipcore
     * graph_ref: optional reference to its graph model
     """
+    __slots__ = ("index", "name", "ipcore_ref", "address", "ports", "routes_info", 
+        "_seen_topo_version", "_seen_routes_version")
+
+    # free lists of port and routes_info entries, shared by all routers. 
+    # Entries are recycled on each update, to avoid allocating new dicts.
+    _port_entry_pool = []
+    _route_entry_pool = []
+
+    # if True, routes_info keeps all the shortest paths for each next router
+    store_full_paths = False
+
     def __init__(self, index, name, **kwargs):
         # Basic properties
         self.index = index
@@ -604,6 +946,7 @@ class router(nocobject):
         # default values
         self.ipcore_ref = None
         self.graph_ref = None
+        self._cached_protocol = None
         # address can be anything, but let use index by default
         # note that address can be overriden with optional arguments in kwargs
         self.address = index
@@ -613,6 +956,9 @@ class router(nocobject):
         self.ports = {}
         # available routes info
         self.routes_info = {}
+        # NoC topology version of the last ports and routes updates
+        self._seen_topo_version = -1
+        self._seen_routes_version = None
 
     # update functions: call them when the underlying NoC structure
     # has changed
@@ -635,20 +981,34 @@ class router(nocobject):
               router and its ipcore.
             * Optional keys can be added to this dictionary with the same 
               meaning as other ports.
+
+        Notes:
+        * Does nothing if the NoC topology has not changed since the last 
+          update. Call graph_ref.invalidate_route_cache() after changing the 
+          NoC by other means than its methods.
         """
+        topo_version = self.graph_ref._topo_version
+        if self._seen_topo_version == topo_version:
+            return
         # port definitions
         localhash = self.address
-        updated_addr = [self.address]
-        for neighborhash in self.graph_ref.neighbors(localhash):
-            neighbor = self.graph_ref.node[neighborhash]["router_ref"]
-            #check if already defined in ports dictionary
-            if neighbor.address not in self.ports:
-                self.ports[neighbor.address] = {}
+        updated_addr = set([self.address])
+        graph_ref = self.graph_ref
+        router_by_idx = graph_ref._router_by_idx
+        local_edges = graph_ref.adj[localhash]
+        ports = self.ports
+        for neighborhash in local_edges:
+            neighbor = router_by_idx[neighborhash]
+            neighbor_addr = neighbor.address
+            # reuse the entry if already defined in ports dictionary
+            port = ports.get(neighbor_addr)
+            if port is None:
+                port = self._get_pool_entry(router._port_entry_pool)
+                ports[neighbor_addr] = port
             # update relevant data
-            self.ports[neighbor.address]["peer"] = neighbor
-            ch_ref = self.graph_ref.edge[localhash][neighborhash]["channel_ref"]
-            self.ports[neighbor.address]["channel"] = ch_ref
-            updated_addr.append(neighbor.address)
+            port["peer"] = neighbor
+            port["channel"] = local_edges[neighborhash]["channel_ref"]
+            updated_addr.add(neighbor_addr)
 
         # special port: ipcore
         if self.address not in self.ports:
@@ -660,10 +1020,9 @@ class router(nocobject):
         self.ports[self.address]["channel"] = self.ipcore_ref.channel_ref 
 
         # clean 'deleted' ports
-        keys = self.ports.iterkeys()
-        for deleted in keys:
-            if deleted not in updated_addr:
-                del self.ports[deleted]
+        for deleted in set(self.ports) - updated_addr:
+            self._release_pool_entry(router._port_entry_pool, self.ports.pop(deleted))
+        self._seen_topo_version = topo_version
 
     def update_routes_info(self):
         """
@@ -674,15 +1033,37 @@ class router(nocobject):
         * keys : the address of all the routers in NoC
         * values : an ordered list of dictionaries with 
             * "next" : address of the next router
-            * "paths" : list of possible paths for key destination
+            * "count" : number of shortest paths through "next"
+            * "paths" : (only if store_full_paths is True) list of possible 
+              paths for key destination. Replaces "count".
         
-        """
-        # this function will calculate a new table!
+        Notes:
+        * The entry dictionaries are recycled on each update. Copy them if 
+          they must be kept after a new update.
+        * Full paths are only stored if the class attribute store_full_paths
+          is True (False by default), because the routing only needs the 
+          next router.
+        * Does nothing if the NoC topology (and store_full_paths) has not 
+          changed since the last update.
+        """
+        routes_version = (self.graph_ref._topo_version, self.store_full_paths)
+        if self._seen_routes_version == routes_version:
+            return
+        # this function will calculate a new table! Old entries go back to
+        # the pool.
+        pool = router._route_entry_pool
+        for entries in self.routes_info.values():
+            for route_entry in entries:
+                self._release_pool_entry(pool, route_entry)
         self.routes_info.clear()
         
         #mynodehash = (self.coord_x, self.coord_y)
         mynodehash = self.index
         
+        # node index to router address, for all routers
+        addrmap = dict((idx, r.address) for idx, r in self.graph_ref._router_by_idx.items())
+        store_full_paths = self.store_full_paths
+        
         for destrouter in self.graph_ref.router_list():
             # discard route to myself
             if destrouter == self:
@@ -691,12 +1072,23 @@ class router(nocobject):
             desthash = destrouter.index
 
             # entry for destrouter
-            self.routes_info[destrouter.index] = []
+            routes = self.routes_info[destrouter.index] = []
+
+            if not store_full_paths:
+                # only next routers and path counts: no need to build the 
+                # paths. The next routers are the predecessors of this one
+                # in the search from destrouter (cached at NoC level), in 
+                # the same order as the paths of all_shortest_paths()
+                counts = self.graph_ref.get_path_counts(desthash)
+                for nextnode in self.graph_ref.get_predecessors(desthash).get(mynodehash, ()):
+                    route_entry = self._get_pool_entry(pool)
+                    route_entry["next"] = addrmap[nextnode]
+                    route_entry["count"] = counts[nextnode]
+                    routes.append(route_entry)
+                continue
 
-            # first: take all shortest paths (function not available on NetworkX)
-            shortest_routes = all_shortest_paths(self.graph_ref, mynodehash, desthash)
-            # convert nodehashes to router addresses
-            shortest_r_addr = [map(lambda x : self.graph_ref.node[x]["router_ref"].address, i) for i in shortest_routes]
+            # first: take all shortest paths (cached at NoC level)
+            shortest_routes = self.graph_ref.get_shortest_paths(mynodehash, desthash)
 
             # NOTE about routing tables: need to think about which routes based on 
             # shortest paths are better in general with other routers, so the links
@@ -705,21 +1097,38 @@ class router(nocobject):
             # A possible workaround lies in the generation of routing tables at
             # NoC level, taking account of neighbors tables and others parameters.
 
-            # extract the next neighbor in each path
-            for route in shortest_r_addr:
+            # extract the next neighbor in each path. Entries are searched by
+            # its "next" key, and keep the order of the first path found.
+            by_next = {}
+            for route in shortest_routes:
                 # first element is myself, last element is its destination. 
                 # for this routing table, we only need the next router to
                 # send the package.
-                newroute = True
-                for route_entry in self.routes_info[destrouter.index]:
-                    if route[1] == route_entry["next"]:
-                        # another route which next element was taken account
-                        route_entry["paths"].append(route)
-                        newroute = False
-                if newroute:
-                    self.routes_info[destrouter.index].append({"next": route[1], "paths": [route]})
+                nextaddr = addrmap[route[1]]
+                route_entry = by_next.get(nextaddr)
+                if route_entry is None:
+                    route_entry = self._get_pool_entry(pool)
+                    route_entry["next"] = nextaddr
+                    route_entry["paths"] = []
+                    by_next[nextaddr] = route_entry
+                    routes.append(route_entry)
+                # add the path to the entry of its next router (converting
+                # nodehashes to router addresses)
+                route_entry["paths"].append([addrmap[x] for x in route])
             # last option: send through another node not in the shortest paths 
             # NOTE: decide if this is needed or make sense
+        self._seen_routes_version = routes_version
+
+    def _get_pool_entry(self, pool):
+        # take an empty dict from a free list
+        if pool:
+            return pool.pop()
+        return {}
+
+    def _release_pool_entry(self, pool, entry):
+        # put back a dict in a free list
+        entry.clear()
+        pool.append(entry)
 
 class channel(nocobject):
     """
@@ -746,12 +1155,16 @@ class channel(nocobject):
     * endpoints : optional two-item list with references to the connected objects
     * intercon_class : optional reference to a intercon class used in this channel.
     """
+    __slots__ = ("index", "name", "endpoints", "intercon_class", 
+        "intercon_class_defargs", "ports")
+
     def __init__(self, name, index=None, **kwargs):
         # Basic properties
         self.index = index
         self.name = name
         # Default values
         self.graph_ref = None
+        self._cached_protocol = None
         self.endpoints = [None, None]
         self.intercon_class = intercon
         self.intercon_class_defargs = {}
@@ -798,7 +1211,7 @@ class channel(nocobject):
             self.ports[idx]["channel"] = self
             # TEMPORAL WORKAROUND: use intercon_class.complement on ipcore side
             # ONLY on case of ipcore channels.
-            if idx == None and hasattr(intercon_class, "complement"):
+            if idx is None and hasattr(intercon_class, "complement"):
                 self.ports[idx]["intercon"] = intercon_class.complement(name=endp.name, **self.intercon_class_defargs)
             else:
                 self.ports[idx]["intercon"] = intercon_class(name=endp.name, **self.intercon_class_defargs)
@@ -948,7 +1361,7 @@ class intercon():
         else:
             # dict with all available MyHDL signal references
             retval = OrderedDict()
-            for key, val in self.signals.iteritems():
+            for key, val in self.signals.items():
                 if isinstance(val["signal_obj"], SignalType):
                     retval[key] = val["signal_obj"]
             return retval
@@ -967,7 +1380,7 @@ class intercon():
         Note: Previous signal objects will be *unreferenced*.
         """
         retval = OrderedDict()
-        for key, sig in self.signals.iteritems():
+        for key, sig in self.signals.items():
             # use bool for 1-bit signals
             if sig["width"] == 1:
                 sig["signal_obj"] = Signal(bool(0))
@@ -1102,7 +1515,7 @@ class signalset(intercon):
             return None
 
 # network and transport layers
-class protocol():
+class protocol(object):
     """
     Protocol base object
 
@@ -1130,7 +1543,19 @@ class protocol():
       added at object construction, but will not check its data consistency. 
       At the moment, we recommend using update_packet_field() method to
       fill this data structures.
+    * Field data is also kept in tuples (in field order) for packet 
+      encoding and decoding. They are rebuilt by update_packet_field(); 
+      call _update_field_cache() after changing packet_format by other 
+      means.
+    * Attributes are declared in __slots__. Other attributes can still be 
+      added (they are stored in __dict__).
     """
+    __slots__ = ("name", "packet_format", "packet_class", "packet_bitlen", 
+        "flit_bitlen", "flit_fixcount", "flit_padbits", "variable_packet", 
+        "description", "long_desc", "_fields", "_field_idx", "_types", 
+        "_bitlen", "_msb", "_lsb", "_shifts", "_masks", "_newpacket_fn", 
+        "__dict__")
+
     def __init__(self, name="", **kwargs):
         """
         Constructor
@@ -1150,6 +1575,7 @@ class protocol():
         self.long_desc = ""
         for key in kwargs.keys():
             setattr(self, key, kwargs[key])
+        self._update_field_cache()
             
     def __repr__(self):
         if self.name != "":
@@ -1180,38 +1606,49 @@ class protocol():
         
         if name in self.packet_format:
             # update field
-            previdx = self.packet_format.keys().index(name) - 1
-            if previdx < 0:
-                # first field
-                lastbitpos = 0
-            else:
-                lastbitpos = self.packet_format[self.packet_format.keys()[previdx]]["lsb"]
-            nextbitpos = lastbitpos + bitlen
-            self.packet_format[name]["type"] = type
-            self.packet_format[name]["position"] = previdx + 1
+            field = self.packet_format[name]
+            field["type"] = type
             # check if the packet format needs to adjust the bit positions
-            if self.packet_format[name]["bitlen"] != bitlen:
-                self.packet_format[name]["bitlen"] = bitlen
-                self.packet_format[name]["lsb"] = nextbitpos
-                self.packet_format[name]["msb"] = lastbitpos
-                # iterate through the rest of the fields adjusting lsb and msb
-                for idx in range(previdx+2, len(self.packet_format.keys())):
-                    curname = self.packet_format.keys()[idx]
-                    curbitlen = self.packet_format[curname]["bitlen"] 
-                    self.packet_format[curname]["lsb"] = nextbitpos + curbitlen
-                    self.packet_format[curname]["msb"] = nextbitpos
-                    nextbitpos += curbitlen
-            self.packet_bitlen = nextbitpos
+            if field["bitlen"] != bitlen:
+                field["bitlen"] = bitlen
+                self._update_bit_positions(field["position"])
         else:
-            # append
-            if len(self.packet_format) == 0:
-                lastbitpos = 0
-            else:
-                lastbitpos = self.packet_format[self.packet_format.keys()[-1]]["lsb"] + 1
+            # append: bit positions start after the last field
+            lastbitpos = self.packet_bitlen
             nextbitpos = lastbitpos + bitlen
             fieldpos = len(self.packet_format)
             self.packet_format[name] = {"type": type, "position": fieldpos, "bitlen": bitlen, "lsb": nextbitpos - 1, "msb": lastbitpos}
             self.packet_bitlen = nextbitpos
+        self._update_field_cache()
+
+    def _update_bit_positions(self, start):
+        # recalculate msb and lsb of the fields from position start (its msb
+        # doesn't change), and the packet length
+        fields = list(self.packet_format.values())[start:]
+        bitpos = fields[0]["msb"]
+        for field in fields:
+            field["msb"] = bitpos
+            bitpos += field["bitlen"]
+            field["lsb"] = bitpos - 1
+        self.packet_bitlen = bitpos
+
+    def _update_field_cache(self):
+        # field names and its data from packet_format, as tuples in field 
+        # order, plus the field index by name
+        fmt = self.packet_format
+        self._fields = tuple(fmt.keys())
+        self._field_idx = dict((name, i) for i, name in enumerate(self._fields))
+        self._types = tuple([fmt[f]["type"] for f in self._fields])
+        self._bitlen = tuple([fmt[f]["bitlen"] for f in self._fields])
+        self._msb = tuple([fmt[f]["msb"] for f in self._fields])
+        self._lsb = tuple([fmt[f]["lsb"] for f in self._fields])
+        # for packet.pack(): shift of each field LSB from the packet LSB, 
+        # and its bit mask (None for non-integer fields)
+        self._shifts = tuple([self.packet_bitlen - l - 1 for l in self._lsb])
+        self._masks = tuple([((1 << b) - 1) if t in ("int", "uint") else None 
+            for t, b in zip(self._types, self._bitlen)])
+        # newpacket() function for these fields, generated on first use
+        self._newpacket_fn = None
             
     def get_field_info(self, name):
         """
@@ -1278,28 +1715,13 @@ class protocol():
         Notes: 
         * kwargs takes precedence over args: i.e. named arguments can overwrite
           nameless arguments.
+        * The work is done by a function generated for the current packet 
+          fields (see _make_newpacket()).
         """
-        retpacket = self.packet_class(protocol_ref=self)
-        fieldlist = self.packet_format.keys()
-        # first named arguments
-        for fkey, fvalue in kwargs.iteritems():
-            if fkey in fieldlist:
-                retpacket[fkey] = fvalue
-                fieldlist.remove(fkey)
-        # then nameless
-        for fidx, fvalue in enumerate(args):
-            fkey = self.packet_format.keys()[fidx]
-            if fkey in fieldlist:
-                retpacket[fkey] = fvalue
-                fieldlist.remove(fkey)
-        # check for empty fields
-        if len(fieldlist) > 0:
-            if zerodefault:
-                for fkey in fieldlist:
-                    retpacket[fkey] = 0
-            else:
-                raise ValueError("Missing fields in argument list: %s" % repr(fieldlist))
-        return retpacket
+        newpacket_fn = self._newpacket_fn
+        if newpacket_fn is None:
+            newpacket_fn = self._newpacket_fn = _make_newpacket(self._fields)
+        return newpacket_fn(self, zerodefault, *args, **kwargs)
     
     def newpacket_frombinary(self, binaryinput):
         """
@@ -1309,28 +1731,60 @@ class protocol():
         * binaryinput: integer or intbv with the binary representation
           of the packet.
         """
-        if isinstance(binaryinput, (int, long)):
+        if isinstance(binaryinput, _integer_types):
             theinput = intbv(binaryinput)[self.packet_bitlen:]
         elif isinstance(binaryinput, intbv):
             theinput = binaryinput
         else:
             raise ValueError("Unsupported type for binaryinput: '%s'" % repr(type(binaryinput)))
         retpacket = self.packet_class(protocol_ref=self)
-        for field, field_info in self.packet_format.iteritems():
+        packet_bitlen = self.packet_bitlen
+        for field, ftype, fmsb, flsb in zip(self._fields, self._types, self._msb, self._lsb):
             # NOTE: msb and lsb indexes are referred as 0 as the MSB bit
             # recalculate to have the LSB bit at 0
-            msb = self.packet_bitlen - field_info["msb"]
-            lsb = self.packet_bitlen - field_info["lsb"] - 1
-            if field_info["type"] == "int":
+            msb = packet_bitlen - fmsb
+            lsb = packet_bitlen - flsb - 1
+            if ftype == "int":
                 #retpacket[field] = theinput[msb:lsb].signed()
                 retpacket[field] = theinput[msb:lsb]
-            elif field_info["type"] == "uint":
+            elif ftype == "uint":
                 retpacket[field] = theinput[msb:lsb]
             else:
-                raise NotImplementedError("Field %s type %s not supported yet." % (field, field_info["type"]))
+                raise NotImplementedError("Field %s type %s not supported yet." % (field, ftype))
         retpacket.prev_repr = binaryinput
         return retpacket
         
+    def unpack(self, binaryinput):
+        """
+        Return the field values of a binary representation of a packet.
+        
+        Arguments:
+        * binaryinput: integer or intbv with the binary representation
+          of the packet (e.g. from packet.pack() ).
+        
+        Return: tuple of integers, in field order.
+        
+        Notes:
+        * As in newpacket_frombinary(), "int" fields are not sign extended.
+        """
+        return self.unpack_batch((binaryinput,))[0]
+
+    def unpack_batch(self, binaryinputs):
+        """
+        Return the field values of several binary representations of 
+        packets. 
+        
+        Arguments:
+        * binaryinputs: list of integers or intbv
+        
+        Return: list with a tuple of integers for each input, in field order.
+        """
+        if None in self._masks:
+            raise NotImplementedError("Only int and uint fields can be extracted from a binary representation.")
+        shifts_masks = list(zip(self._shifts, self._masks))
+        return [tuple([(value >> fshift) & fmask for fshift, fmask in shifts_masks]) 
+            for value in map(int, binaryinputs)]
+
     def newpacket_fromflits(self, flits_list):
         """
         Return a new packet based on a list of flits
@@ -1344,11 +1798,11 @@ class protocol():
         extracted = []
         flit_curbit = self.flit_bitlen
         flit_idx = 0
-        for field, field_info in self.packet_format.iteritems():
-            flit_val = intbv(0)[field_info["bitlen"]:]
+        for fbitlen in self._bitlen:
+            flit_val = intbv(0)[fbitlen:]
             
             msb = flit_curbit
-            lsb = flit_curbit - field_info["bitlen"]
+            lsb = flit_curbit - fbitlen
             
             if lsb < 0:
                 
@@ -1366,7 +1820,7 @@ class protocol():
                         flit_val[lsb_pend:lsb_pend-self.flit_bitlen] = flits_list[flit_idx]
                         flit_idx += 1
                         flit_curbit = self.flit_bitlen
-                        lsb_pend -= field_info["bitlen"]
+                        lsb_pend -= fbitlen
                     else:
                         # last flit
                         flit_val[lsb_pend:] = flits_list[flit_idx][:self.flit_bitlen-lsb_pend]
@@ -1374,7 +1828,7 @@ class protocol():
                         lsb_pend = 0
             else:
                 flit_val = flits_list[flit_idx][msb:lsb]
-                flit_curbit -= field_info["bitlen"]
+                flit_curbit -= fbitlen
                 
             extracted.append(flit_val)
             if lsb == 0:
@@ -1383,14 +1837,14 @@ class protocol():
                 flit_curbit = self.flit_bitlen
 
         retpacket = self.packet_class(protocol_ref=self)
-        for field, content in zip(self.packet_format.keys(), extracted):
-            if self.packet_format[field]["type"] == "int":
+        for field, ftype, content in zip(self._fields, self._types, extracted):
+            if ftype == "int":
                 #retpacket[field] = theinput[msb:lsb].signed()
                 retpacket[field] = content
-            elif self.packet_format[field]["type"] == "uint":
+            elif ftype == "uint":
                 retpacket[field] = content
             else:
-                raise NotImplementedError("Field %s type %s not supported yet." % (field, self.packet_format[field]["type"]))
+                raise NotImplementedError("Field %s type %s not supported yet." % (field, ftype))
         retpacket.prev_repr = flits_list
         return retpacket
         
@@ -1404,6 +1858,45 @@ class protocol():
             raise TypeError("Argument 'packet_class' must derive from 'packet' class.")
         self.packet_class = packet_class
 
+# sentinel for missing field values in newpacket()
+_missing = object()
+
+def _make_newpacket(fields):
+    """
+    Generate a newpacket function for a protocol with the given fields.
+
+    Arguments:
+    * fields: tuple with the field names, in packet order
+
+    Return: a function with the same arguments as protocol.newpacket(), 
+    that sets each field with one statement (no loops over the fields).
+    """
+    src = ["def newpacket(self, zerodefault=True, *args, **kwargs):",
+        "    nargs = len(args)",
+        # more args than fields: same error as a field lookup by position
+        "    if nargs > %d:" % len(fields),
+        "        raise IndexError(\"list index out of range\")",
+        "    default = 0 if zerodefault else _missing",
+        "    p = self.packet_class(protocol_ref=self)"]
+    # without named arguments, take the values from args only
+    src.extend(["    if not kwargs:", "        pass"])
+    for fidx, fkey in enumerate(fields):
+        src.append("        p[%r] = args[%d] if nargs > %d else default" 
+            % (fkey, fidx, fidx))
+    src.extend(["    else:", "        get = kwargs.get"])
+    for fidx, fkey in enumerate(fields):
+        src.append("        p[%r] = get(%r, args[%d]) if nargs > %d else get(%r, default)" 
+            % (fkey, fkey, fidx, fidx, fkey))
+    # all fields given by args: no need to look for missing values
+    src.extend(["    if default is _missing and (kwargs or nargs < %d):" % len(fields),
+        "        missing = [fkey for fkey in self._fields if p[fkey] is _missing]",
+        "        if missing:",
+        "            raise ValueError(\"Missing fields in argument list: %s\" % repr(missing))",
+        "    return p"])
+    namespace = {"_missing": _missing}
+    exec("\n".join(src), namespace)
+    return namespace["newpacket"]
+
 class packet(dict):
     """
     Packet base object
@@ -1423,7 +1916,13 @@ class packet(dict):
       - <type long> : was created with a numeric representation.
       - <type list> : was created with a list of flits
       This attribute should only be changed by its protocol object.
+
+    Notes:
+    * Attributes are declared in __slots__, so a packet doesn't allocate 
+      an attribute dictionary besides its field values. Other attributes 
+      can still be added (they are stored in __dict__).
     """
+    __slots__ = ("protocol_ref", "prev_repr", "__dict__")
     
     # TODO: add support for flit construction: temporal storage for flits,
     # and package construction after final flit
@@ -1441,7 +1940,7 @@ class packet(dict):
         # Warning: take account of each element inside, specially if it's 
         # a intbv
         basedict = dict(**self)
-        for k, v in self.iteritems():
+        for k, v in self.items():
             if isinstance(v, intbv):
                 # make a copy
                 basedict[k] = intbv(v)
@@ -1460,24 +1959,25 @@ class packet(dict):
         binary_flits = [intbv(0)[protocol_ref.flit_bitlen:] for i in range(protocol_ref.flit_fixcount)]
         flit_curbit = protocol_ref.flit_bitlen
         flit_idx = 0
-        for field, field_info in protocol_ref.packet_format.iteritems():
-            if field_info["type"] == "int" or field_info["type"] == "uint":
-                bitvalue = intbv(self[field])[field_info["bitlen"]:]
-            elif field_info["type"] == "fixed":
+        for field, ftype, fbitlen in zip(protocol_ref._fields, protocol_ref._types, 
+                protocol_ref._bitlen):
+            if ftype == "int" or ftype == "uint":
+                bitvalue = intbv(self[field])[fbitlen:]
+            elif ftype == "fixed":
                 raise NotImplementedError("Don't know how to put a fixed point in a binary representation.")
-            elif field_info["type"] == "float":
+            elif ftype == "float":
                 raise NotImplementedError("Don't know how to put a float in a binary representation.")
                 
             #{"type": type, "position": fieldpos, "bitlen": bitlen, "lsb": nextbitpos, "msb": lastbitpos}
             msb_flit = flit_curbit
-            lsb_flit = flit_curbit - field_info["bitlen"]
+            lsb_flit = flit_curbit - fbitlen
             
             if lsb_flit < 0:
                 # split packet field into several flits
                 lsb_flit_pend = -lsb_flit
                 
                 # first flit
-                binary_flits[flit_idx][msb_flit:] = bitvalue[field_info["bitlen"]:flit_curbit]
+                binary_flits[flit_idx][msb_flit:] = bitvalue[fbitlen:flit_curbit]
                 flit_idx += 1
                 flit_curbit = protocol_ref.flit_bitlen
                 while lsb_flit_pend > 0:
@@ -1485,7 +1985,7 @@ class packet(dict):
                         binary_flits[flit_idx] = bitvalue
                         flit_idx += 1
                         flit_curbit = protocol_ref.flit_bitlen
-                        lsb_flit_pend -= field_info["bitlen"]
+                        lsb_flit_pend -= fbitlen
                     else:
                         # last flit
                         binary_flits[flit_idx][:protocol_ref.flit_bitlen - lsb_flit_pend] = bitvalue[lsb_flit_pend:]
@@ -1493,13 +1993,13 @@ class packet(dict):
                 
             else:
                 binary_flits[flit_idx][msb_flit:lsb_flit] = bitvalue
-                flit_curbit -= field_info["bitlen"]
+                flit_curbit -= fbitlen
                 
             if lsb_flit == 0:
                 # next flit
                 flit_idx += 1
                 flit_curbit = protocol_ref.flit_bitlen
-            #print "integer repr: FIELD %s bitval %d b%s\n field info %s recalc msb %d lsb %d" % (field, bitvalue, bin(bitvalue), repr(field_info), msb, lsb)
+            #print "integer repr: FIELD %s bitval %d b%s\n recalc msb %d lsb %d" % (field, bitvalue, bin(bitvalue), msb, lsb)
             
             #print "integer repr: TEMP BIN %d b%s" % (binaryout, bin(binaryout))
         #print "integer repr: FINAL BIN %d b%s" % (binaryout, bin(binaryout))
@@ -1512,25 +2012,42 @@ class packet(dict):
         """
         protocol_ref = self.protocol_ref
         #binaryout = 0
-        binaryout = intbv(0)[protocol_ref.packet_bitlen:]
-        for field, field_info in protocol_ref.packet_format.iteritems():
+        packet_bitlen = protocol_ref.packet_bitlen
+        binaryout = intbv(0)[packet_bitlen:]
+        for field, ftype, fbitlen, fmsb, flsb in zip(protocol_ref._fields, 
+                protocol_ref._types, protocol_ref._bitlen, protocol_ref._msb, 
+                protocol_ref._lsb):
             bitvalue = self[field]
             #{"type": type, "position": fieldpos, "bitlen": bitlen, "lsb": nextbitpos, "msb": lastbitpos}
             # NOTE: msb and lsb indexes are referred as 0 as the MSB bit
             # recalculate to have the LSB bit at 0
-            msb = protocol_ref.packet_bitlen - field_info["msb"]
-            lsb = protocol_ref.packet_bitlen - field_info["lsb"] - 1
-            #print "integer repr: FIELD %s bitval %d b%s\n field info %s recalc msb %d lsb %d" % (field, bitvalue, bin(bitvalue), repr(field_info), msb, lsb)
-            if field_info["type"] == "int" or field_info["type"] == "uint":
+            msb = packet_bitlen - fmsb
+            lsb = packet_bitlen - flsb - 1
+            #print "integer repr: FIELD %s bitval %d b%s\n recalc msb %d lsb %d" % (field, bitvalue, bin(bitvalue), msb, lsb)
+            if ftype == "int" or ftype == "uint":
                 #binaryout |= (bitvalue << lsb)
-                binaryout[msb:lsb] = intbv(bitvalue)[field_info["bitlen"]:]
-            elif field_info["type"] == "fixed":
+                binaryout[msb:lsb] = intbv(bitvalue)[fbitlen:]
+            elif ftype == "fixed":
                 raise NotImplementedError("Don't know how to put a fixed point in a binary representation.")
-            elif field_info["type"] == "float":
+            elif ftype == "float":
                 raise NotImplementedError("Don't know how to put a float in a binary representation.")
             #print "integer repr: TEMP BIN %d b%s" % (binaryout, bin(binaryout))
         #print "integer repr: FINAL BIN %d b%s" % (binaryout, bin(binaryout))
         return binaryout
+
+    def pack(self):
+        """
+        Returns the same binary representation as get_integer_repr(), as a 
+        Python integer (int or long).
+        """
+        protocol_ref = self.protocol_ref
+        binaryout = 0
+        for field, fmask, fshift in zip(protocol_ref._fields, 
+                protocol_ref._masks, protocol_ref._shifts):
+            if fmask is None:
+                raise NotImplementedError("Don't know how to put field %s (type %s) in a binary representation." % (field, protocol_ref.packet_format[field]["type"]))
+            binaryout |= (int(self[field]) & fmask) << fshift
+        return binaryout
         
     
 # *******************************
@@ -1538,34 +2055,52 @@ class packet(dict):
 # *******************************
 
 # Missing function in NetworkX
-def all_shortest_paths(G,a,b):
+def all_shortest_paths(G,a,b,pred=None):
     """ 
     Return a list of all shortest paths in graph G between nodes a and b
     This is a function not available in NetworkX (checked at 22-02-2011)
 
+    Optional argument pred is the result of nx.predecessor(G,b), to reuse
+    it between calls with the same b. If G is a NoC model, its cached 
+    predecessors are used by default.
+
     Taken from: 
     http://groups.google.com/group/networkx-discuss/browse_thread/thread/55465e6bb9bae12e
     """
     ret = []
-    pred = nx.predecessor(G,b)
-    if not pred.has_key(a):  # b is not reachable from a
+    if pred is None:
+        if isinstance(G, noc):
+            pred = G.get_predecessors(b)
+        else:
+            pred = nx.predecessor(G,b)
+    if a not in pred:  # b is not reachable from a
         return []
-    pth = [[a,0]]
-    pthlength = 1  # instead of array shortening and appending, which are relatively
-    ind = 0        # slow operations, we will just overwrite array elements at position ind
+    # all shortest paths have the same length: get it by following the 
+    # first predecessors, and preallocate the path arrays
+    pthlength = 1
+    n = a
+    while n != b:
+        n = pred[n][0]
+        pthlength += 1
+    # path nodes, and index of the next predecessor to try at each node
+    pth_nodes = [a] + [None] * (pthlength - 1)
+    pth_i = [0] * pthlength
+    ind = 0        # instead of array shortening and appending, which are relatively
+                   # slow operations, we will just overwrite array elements at position ind
     while ind >= 0:
-        n,i = pth[ind]
-        if n == b:
-            ret.append(map(lambda x:x[0],pth[:ind+1]))
-        if len(pred[n]) > i:
+        n = pth_nodes[ind]
+        i = pth_i[ind]
+        preds_n = pred[n]
+        # usual case first: go to the next predecessor
+        if i < len(preds_n):
             ind += 1
-            if ind == pthlength:
-                pth.append([pred[n][i],0])
-                pthlength += 1
-            else:
-                pth[ind] = [pred[n][i],0]
-        else:
-            ind -= 1
-            if ind >= 0:
-                pth[ind][1] += 1
+            pth_nodes[ind] = preds_n[i]
+            pth_i[ind] = 0
+            continue
+        # b has no predecessors: a path is complete
+        if n == b:
+            ret.append(pth_nodes[:ind+1])
+        ind -= 1
+        if ind >= 0:
+            pth_i[ind] += 1
     return ret
@@ -70,20 +70,21 @@ def draw_noc(noc, rectangular=True, nodepos=None):
 
     # node positions
     if rectangular:
-        if nodepos == None:
+        if nodepos is None:
             nodepos = {}
             for i in noc.router_list():
                 nodepos[i.index] = (i.coord_x, i.coord_y)
     else:
-        if nodepos == None:
+        if nodepos is None:
             raise ValueError("For non-rectangular layouts this function needs argument 'nodepos'")
 
     # some parameters
     ip_relpos = (-0.3, 0.3) # relative to router
     # node labels
     nodelabels = {}
-    for i in nodepos.iterkeys():
-        nodelabels[i] = noc.node[i]["router_ref"].name
+    routers = nx.get_node_attributes(noc, "router_ref")
+    for i in nodepos:
+        nodelabels[i] = routers[i].name
 
     # channel positions
     chpos = {}
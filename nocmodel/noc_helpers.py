@@ -45,7 +45,7 @@ def generate_squarenoc(orderx=3, ordery=None, with_ipcore=False):
       of order "orderx". This argument is used to build rectangular grids.
     * with_ipcore: If True, add ipcores to routers automatically.
     """
-    if ordery == None:
+    if ordery is None:
         ordery = orderx
         
     # 1. generate a 2d grid
@@ -53,26 +53,26 @@ def generate_squarenoc(orderx=3, ordery=None, with_ipcore=False):
     
     # 2. convert to a graph with ints as nodes
     convgrid = nx.Graph()
-    for n in basegrid.nodes_iter():
+    for n in basegrid.nodes():
         n2 = n[0] + n[1]*orderx
         convgrid.add_node(n2, coord_x=n[0], coord_y=n[1])
-    for e in basegrid.edges_iter():
+    for e in basegrid.edges():
         e1 = e[0][0] + e[0][1]*orderx
         e2 = e[1][0] + e[1][1]*orderx
         convgrid.add_edge(e1, e2)
         
-    nocbase = noc(name="NoC grid %dx%d" % (orderx, ordery), data=convgrid)
+    nocbase = noc(convgrid, name="NoC grid %dx%d" % (orderx, ordery))
 
     # 2. for each node add router object
-    for n in nocbase.nodes_iter():
-        cx = nocbase.node[n]["coord_x"]
-        cy = nocbase.node[n]["coord_y"]
+    for n, d in list(nocbase.nodes(data=True)):
+        cx = d["coord_x"]
+        cy = d["coord_y"]
         r = nocbase._add_router_from_node(n, coord_x=cx, coord_y=cy)
         if with_ipcore:
             nocbase.add_ipcore(r)
     
     # 3. for each edge add channel object
-    for e in nocbase.edges_iter():
+    for e in list(nocbase.edges()):
         nocbase._add_channel_from_edge(e)
     
     return nocbase
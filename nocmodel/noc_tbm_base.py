@@ -51,8 +51,12 @@ import logging
 from noc_base import *
 
 import inspect
+import itertools
 
-class noc_tbm_base():
+# public class attribute names, by TBM class. Used by debugstate()
+_debugstate_class_attrs = {}
+
+class noc_tbm_base(object):
     """
     Base class for NoC TBM simulator.
     
@@ -65,9 +69,16 @@ class noc_tbm_base():
     * recv()
     
     Other methods are related to simulation configuration and logging support.
+    
+    Notes:
+    * This class and its derived classes declare __slots__ for its attributes.
+      Other attributes can still be added (they are stored in __dict__).
+    * Each object logs through its own logger "nocmodel.<logname>", child 
+      of the "nocmodel" logger. It changes when logname is assigned.
     """
+    __slots__ = ("log", "_logname", "generators", "tracesend", "tracerecv", "__dict__")
+
     def __init__(self):
-        self.log = logging.getLogger()
         self.logname = "BASECLASS"
         self.generators = []
         self.tracesend = []
@@ -79,6 +90,15 @@ class noc_tbm_base():
         else:
             return "<%s at '%d'>" % (self.__class__.__name__, id(self))
 
+    @property
+    def logname(self):
+        return self._logname
+
+    @logname.setter
+    def logname(self, value):
+        self._logname = value
+        self.log = logging.getLogger("nocmodel." + value)
+
     def get_generators(self):
         return self.generators
         
@@ -105,7 +125,7 @@ class noc_tbm_base():
         Return: Must return a number: 0 for everything OK, != 0 to show an error
             relevant to the caller, an exception in case of attribute error
         """
-        self.debug("-> send( %s , %s , %s , %s )" % (repr(src), repr(dest), repr(packet), repr(addattrs)))
+        self.debug("-> send( %r , %r , %r , %r )", src, dest, data, addattrs)
         return noc_tbm_errcodes.not_implemented
 
     def recv(self, src, dest, data, addattrs=None):
@@ -125,14 +145,18 @@ class noc_tbm_base():
         @return Must return a number: 0 for everything OK, != 0 to show an error
             relevant to the caller, an exception in case of attribute error
         """
-        self.debug("-> recv( %s , %s , %s , %s )" % (repr(src), repr(dest), repr(packet), repr(addattrs)))
+        self.debug("-> recv( %r , %r , %r , %r )", src, dest, data, addattrs)
         return noc_tbm_errcodes.not_implemented
     
-    # logging methods (only use 4 levels)
+    # logging methods (only use 4 levels). Check the level first, to skip
+    # the call setup on disabled levels, then log with Logger._log (the 
+    # public methods would check the level again).
     def debug(self, msg, *args, **kwargs):
-        self.log.debug(msg, extra={"objname": self.logname}, *args, **kwargs)
+        if self.log.isEnabledFor(logging.DEBUG):
+            self.log._log(logging.DEBUG, msg, args, extra={"objname": self.logname}, **kwargs)
     def info(self, msg, *args, **kwargs):
-        self.log.info(msg, extra={"objname": self.logname}, *args, **kwargs)
+        if self.log.isEnabledFor(logging.INFO):
+            self.log._log(logging.INFO, msg, args, extra={"objname": self.logname}, **kwargs)
     def warning(self, msg, *args, **kwargs):
         self.log.warning(msg, extra={"objname": self.logname}, *args, **kwargs)
     def error(self, msg, *args, **kwargs):
@@ -140,12 +164,22 @@ class noc_tbm_base():
 
     # special log
     def debugstate(self):
-        self.debug(" '%s' object state: " % repr(self))
-        for i in dir(self):
-            # exclude hidden attributes
-            if i[0] == "_":
+        if not self.log.isEnabledFor(logging.DEBUG):
+            return
+        self.debug(" '%r' object state: ", self)
+        # same names as dir(self): class attributes (calculated once for 
+        # each class) and instance attributes. Exclude hidden attributes.
+        cls = self.__class__
+        classattrs = _debugstate_class_attrs.get(cls)
+        if classattrs is None:
+            classattrs = frozenset([i for i in dir(cls) if i[0] != "_"])
+            _debugstate_class_attrs[cls] = classattrs
+        attrs = classattrs.union([i for i in self.__dict__ if i[0] != "_"])
+        for i in sorted(attrs):
+            # exclude slots without value
+            if not hasattr(self, i):
                 continue
-            self.debug("     ['%s'] = %s " % (i, repr(getattr(self, i))))
+            self.debug("     ['%s'] = %r ", i, getattr(self, i))
     def generators_info(self):
         self.debug(" Registered generators for '%s': " % repr(self))
         for g in self.generators:
@@ -172,7 +206,11 @@ class noc_tbm_simulation():
         # configure logging system
         # log errors to console, custom log to log_file if specified
         addmsg = ""
-        self.log = logging.getLogger()
+        # handlers and level are set on the "nocmodel" logger: objects log 
+        # through its child loggers, and its records propagate to it. The 
+        # simulation time is added by a filter in each handler (logger 
+        # filters don't apply to records from child loggers).
+        self.log = logging.getLogger("nocmodel")
         self.log.setLevel(log_level)
         console_hdl = logging.StreamHandler()
         console_hdl.setLevel(logging.WARNING)
@@ -180,16 +218,18 @@ class noc_tbm_simulation():
             def filter(self, record):
                 record.myhdltime = myhdl.now()
                 return True
-        self.log.addFilter(SimTimeFilter())
+        self.simtime_filter = SimTimeFilter()
         self.noc_formatter = logging.Formatter("%(myhdltime)4d:%(levelname)-5s:%(objname)-16s - %(message)s")
+        console_hdl.addFilter(self.simtime_filter)
         console_hdl.setFormatter(self.noc_formatter)
         self.log.addHandler(console_hdl)
-        if log_file != None:
+        if log_file is not None:
             file_hdl = logging.FileHandler(log_file, 'w')
             file_hdl.setLevel(log_level)
+            file_hdl.addFilter(self.simtime_filter)
             file_hdl.setFormatter(self.noc_formatter)
             self.log.addHandler(file_hdl)
-            addmsg = "and on file (%s) level %s" % (log_file, logging._levelNames[log_level])
+            addmsg = "and on file (%s) level %s" % (log_file, logging.getLevelName(log_level))
         # ready to roll
         self.debug("Logging enabled! Running log on console level WARNING %s" % addmsg)
 
@@ -204,13 +244,16 @@ class noc_tbm_simulation():
         """
         # myhdl simulation: extract all generators and prepare 
         # arguments
-        for obj in self.noc_ref.all_list():
-            prevcount = len(add_generators)
-            add_generators.extend(obj.tbm.get_generators())
-            #self.debug("configure_simulation: adding %d generators from object %s" % (len(add_generators)-prevcount, repr(obj)))
-            if isinstance(obj, ipcore):
-                add_generators.extend(obj.channel_ref.tbm.get_generators())
-                #self.debug("configure_simulation: plus ipcore channel: adding %d generators from object %s" % (len(add_generators)-prevcount, repr(obj.channel_ref)))
+        def object_generators():
+            for obj in self.noc_ref.all_list():
+                yield obj.tbm.get_generators()
+                #self.debug("configure_simulation: adding %d generators from object %s" % (len(obj.tbm.get_generators()), repr(obj)))
+                if isinstance(obj, ipcore):
+                    yield obj.channel_ref.tbm.get_generators()
+                    #self.debug("configure_simulation: plus ipcore channel: adding %d generators from object %s" % (len(obj.channel_ref.tbm.get_generators()), repr(obj.channel_ref)))
+        # (build a new list: don't modify the argument)
+        add_generators = list(itertools.chain(add_generators, 
+            itertools.chain.from_iterable(object_generators())))
         # --------------------------------
         # debug info
         # TODO: try to get info about generators, particularly obtain origin 
@@ -236,7 +279,10 @@ class noc_tbm_simulation():
         # --------------------------------
         self.sim_object = myhdl.Simulation(*add_generators)
         self.sim_duration = max_time
-        self.debug("configure_simulation: will run until simulation time '%d'" % max_time)
+        if max_time is None:
+            self.debug("configure_simulation: will run without time limit")
+        else:
+            self.debug("configure_simulation: will run until simulation time '%d'", max_time)
 
     def run(self):
         """
@@ -265,35 +311,27 @@ class noc_tbm_simulation():
         * basefilename: generated filenames will start with this string
         * log_level: optional logging level for previous files
         """
-        # base filter
-        class ObjFilter(logging.Filter):
-            def __init__(self, basename):
-                self.basename = basename
-            def filter(self, record):
-                if record.objname == self.basename:
-                    return True
-                return False
-        # need a handler for each object
+        # need a handler for each object, in its own logger
         for obj in self.noc_ref.all_list():
-            newfilter = ObjFilter(obj.tbm.logname)
             newhandler = logging.FileHandler("%s_%s.log" % (basefilename, obj.tbm.logname), "w")
             newhandler.setLevel(log_level)
-            newhandler.addFilter(newfilter)
+            newhandler.addFilter(self.simtime_filter)
             newhandler.setFormatter(self.noc_formatter)
-            self.log.addHandler(newhandler)
+            obj.tbm.log.addHandler(newhandler)
         # Transactions logger
         class TransFilter(logging.Filter):
+            # transaction messages start with "->" (checked before 
+            # formatting the message)
             def filter(self, record):
-                if record.message.find("->") == 0:
-                    return True
-                return False
+                return str(record.msg).startswith("->")
         newhandler = logging.FileHandler("%s_transactions.log" % basefilename, "w")
         newhandler.setLevel(log_level)
         newhandler.addFilter(TransFilter())
+        newhandler.addFilter(self.simtime_filter)
         newhandler.setFormatter(self.noc_formatter)
         self.log.addHandler(newhandler)
         # TopNoC will not be added to this set
-        self.debug("Special logging enabled. basefilename=%s level %s" % (basefilename, logging._levelNames[log_level]))
+        self.debug("Special logging enabled. basefilename=%s level %s" % (basefilename, logging.getLevelName(log_level)))
 
 class noc_tbm_errcodes():
     """
@@ -46,6 +46,12 @@ from noc_tbm_base import *
 from nocmodel.basicmodels import *
 
 # helper functions
+
+# basic TBM model for each NoC object class
+_tbm_basic_models = {
+    router: basic_router_tbm, 
+    channel: basic_channel_tbm}
+
 def add_tbm_basic_support(instance, **kwargs):
     """
     This function will add for every object in noc_instance a noc_tbm object
@@ -53,12 +59,16 @@ def add_tbm_basic_support(instance, **kwargs):
     if isinstance(instance, noc):
         # add simulation object
         instance.tbmsim = noc_tbm_simulation(instance, **kwargs)
-        # and add tbm objects recursively
+        # and add tbm objects recursively. Logging arguments are only for
+        # the simulation object.
+        objkwargs = dict([(k, v) for k, v in kwargs.items() 
+            if k not in ("log_file", "log_level")])
         for obj in instance.all_list():
-            altkwargs = kwargs
-            altkwargs.pop("log_file", None)
-            altkwargs.pop("log_level", None)
-            add_tbm_basic_support(obj, **kwargs)
+            add_tbm_basic_support(obj, **objkwargs)
+        return
+    model = _tbm_basic_models.get(type(instance))
+    if model is not None:
+        instance.tbm = model(instance, **kwargs)
     elif isinstance(instance, ipcore):
         instance.tbm = basic_ipcore_tbm(instance, **kwargs)
         # don't forget internal channel